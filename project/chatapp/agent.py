@@ -1,8 +1,10 @@
-import os
+import json
+import logging
 import time
 import random
+from asgiref.sync import sync_to_async
 from dotenv import load_dotenv
-from ollama import Client, Tool
+from ollama import Client
 
 # Import your tool functions
 from .toolss import (
@@ -11,11 +13,18 @@ from .toolss import (
     get_product_detail,
     get_active_offers,
 )
+from .memory import conversations
+from .gateway import llm_gateway
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 
-client = Client()
+client = Client()  # blocking client, CLI only; web requests go through llm_gateway
+
+MODEL = "llama3.1:8b"
+# a reply may chain a few tool calls, never loop forever
+MAX_TOOL_ROUNDS = 3
 
 # System prompt
 SYSTEM_PROMPT = """
@@ -30,46 +39,55 @@ Rules:
 - If you need clarification, ask.
 """
 
-# Wrap your functions as Ollama Tool objects
-TOOLS = [
-    Tool(name="get_categories", description="Returns all product categories", func=get_categories),
-    Tool(name="get_products", description="Returns products in a category", func=get_products),
-    Tool(name="get_product_detail", description="Returns details for a product", func=get_product_detail),
-    Tool(name="get_active_offers", description="Returns all active offers", func=get_active_offers),
-]
+# Describe your tool functions to Ollama as JSON-schema function specs
+TOOL_REGISTRY = {
+    tool.name: tool
+    for tool in (get_categories, get_products, get_product_detail, get_active_offers)
+}
+
+
+def tool_schema(tool):
+    return {
+        "type": "function",
+        "function": {
+            "name": tool.name,
+            "description": tool.description,
+            "parameters": {"type": "object", "properties": dict(tool.args or {})},
+        },
+    }
 
-# Conversation history to maintain multi-turn context
-conversation = [
-    {"role": "system", "content": SYSTEM_PROMPT}
-]
 
+TOOLS = [tool_schema(tool) for tool in TOOL_REGISTRY.values()]
 
-def loading_animation(text="Loading", duration=2):
-    """Simulates a loading animation."""
-    for _ in range(duration):
-        for dots in range(1, 4):
-            print(f"\r{text}{'.' * dots}   ", end="", flush=True)
-            time.sleep(0.5)
-    print("\r", end="")
+# Conversation history lives per session in chatapp.memory, bounded and shared by every worker
 
 
-def run_agent(user_input: str) -> str:
+def run_tool(name, arguments):
+    """Run one tool the model asked for; unknown tools and failures come back as an error payload."""
+    tool = TOOL_REGISTRY.get(name)
+    if tool is None:
+        return {"error": f"Unknown tool {name}"}
+    try:
+        return tool.invoke(arguments or {})
+    except Exception as e:
+        return {"error": f"{name} failed: {e}"}
+
+
+def run_agent(user_input: str, session_id: str = "cli") -> str:
     """
     Sends user input to the Ollama model, allowing it to call your tools.
-    Maintains conversation history for multi-turn chats.
-    Includes immersive loading/thinking animations and error handling.
+    Keeps a bounded history per ``session_id`` for multi-turn chats.
+    Includes error handling; progress is streamed by stream_agent instead.
     """
     try:
-    
-        loading_animation("Thinking", duration=random.randint(2, 4))
 
-        
-        conversation.append({"role": "user", "content": user_input})
+        conversations.append(session_id, "user", user_input)
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}] + conversations.history(session_id)
 
         
         response = client.chat(
-            model="llama3.1:8b", 
-            messages=conversation,
+            model=MODEL,
+            messages=messages,
             tools=TOOLS
         )
 
@@ -79,11 +97,7 @@ def run_agent(user_input: str) -> str:
             raise ValueError("Model returned empty response.")
 
         
-        conversation.append({"role": "assistant", "content": reply})
-
-        # Simulate “fetching data” animation if certain keywords
-        if any(word in reply.lower() for word in ["loading", "fetching", "retrieving"]):
-            loading_animation("Fetching data from store", duration=3)
+        conversations.append(session_id, "assistant", reply)
 
         return reply
 
@@ -99,6 +113,66 @@ def run_agent(user_input: str) -> str:
         return "Sorry, I couldn't process that. Could you try again?"
 
 
+async def stream_agent(user_input: str, session_id: str = "cli", lease=None):
+    """
+    Async version of run_agent that yields (event, data) as things happen:
+    "token" for every piece of model output, "tool" when a tool call starts
+    and finishes, then "done" with the full reply (or "error").
+    Tool calls the model makes are run and fed back, up to MAX_TOOL_ROUNDS.
+    Runs under a gateway ``lease``, taken here when the caller has none, and
+    releases it when done.
+    """
+    lease = lease or await llm_gateway.acquire(MODEL)
+    try:
+        await conversations.aappend(session_id, "user", user_input)
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}] + await conversations.ahistory(session_id)
+
+        reply = ""
+        for _ in range(MAX_TOOL_ROUNDS + 1):
+            parts, tool_calls = [], []
+            stream = await llm_gateway.client().chat(model=MODEL, messages=messages, tools=TOOLS, stream=True)
+            async for chunk in stream:
+                if chunk.message.content:
+                    parts.append(chunk.message.content)
+                    yield "token", {"text": chunk.message.content}
+                if chunk.message.tool_calls:
+                    tool_calls.extend(chunk.message.tool_calls)
+
+            reply = "".join(parts)
+            if not tool_calls:
+                break
+
+            messages.append({"role": "assistant", "content": reply, "tool_calls": tool_calls})
+            for call in tool_calls:
+                name = call.function.name
+                yield "tool", {"name": name, "status": "running"}
+                # the tools use the ORM, which has to run off the event loop
+                result = await sync_to_async(run_tool)(name, dict(call.function.arguments or {}))
+                yield "tool", {"name": name, "status": "done"}
+                messages.append({"role": "tool", "tool_name": name, "content": json.dumps(result, default=str)})
+
+        if not reply:
+            raise ValueError("Model returned empty response.")
+        await conversations.aappend(session_id, "assistant", reply)
+        yield "done", {"response": reply}
+
+    except Exception:
+        logger.exception("Chat reply failed for session %s", session_id)
+        yield "error", {"error": "Sorry, I couldn't process that. Could you try again?"}
+    finally:
+        lease.release()
+
+
+async def ask_agent(user_input: str, session_id: str = "cli", lease=None) -> str:
+    """stream_agent collected into the full reply, for callers that don't stream."""
+    async for event, data in stream_agent(user_input, session_id, lease):
+        if event == "done":
+            return data["response"]
+        if event == "error":
+            return data["error"]
+    return ""
+
+
 if __name__ == "__main__":
     print("🛍️ Welcome to the Shopping AI Assistant!")
     print("Type 'exit' or 'quit' to leave.\n")
@@ -0,0 +1,61 @@
+# chatapp/catalog.py
+# in-process reads behind the chat tools, no HTTP round trip to our own server
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from products.documents import build_product_documents, catalog_documents, document_data
+from products.models import Category, Offer, ProductDocument, SubCategory
+from products.serializers import OfferSerializer
+
+from .toolcache import cached_tool
+
+# the model only needs a sample of a category to answer, not every product in it
+CHAT_PRODUCT_LIMIT = 50
+
+
+@cached_tool("categories")
+def categories():
+    """Active categories with their subcategory ids and names, in two queries."""
+    queryset = Category.objects.filter(is_active=True).only('id', 'name', 'slug', 'description').prefetch_related(
+        Prefetch('subcategories', queryset=SubCategory.objects.only('id', 'name', 'category_id').order_by('id'))
+    )
+    return [
+        {
+            "id": category.id,
+            "name": category.name,
+            "slug": category.slug,
+            "description": category.description,
+            "subcategories": [{"id": sub.id, "name": sub.name} for sub in category.subcategories.all()],
+        }
+        for category in queryset
+    ]
+
+
+@cached_tool("products")
+def products(category=None, subcategory=None, limit=CHAT_PRODUCT_LIMIT):
+    """Newest available products as precomputed documents, same payload as product_list."""
+    documents = catalog_documents({"category": category, "subcategory": subcategory})
+    return document_data(documents.order_by('-created_at', '-pk')[:limit])
+
+
+@cached_tool("product_detail")
+def product_detail(product_id):
+    """One product document, same payload as product_detail; None when unavailable."""
+    document = ProductDocument.objects.filter(product_id=product_id).first()
+    if document is None:
+        built = build_product_documents([product_id])
+        document = built[0] if built else None
+    if document is None or not document.available:
+        return None
+    return document_data([document])[0]
+
+
+@cached_tool("active_offers")
+def active_offers():
+    """Live offers with campaign and product, one query, same payload as active_offers."""
+    now = timezone.now()
+    offers = Offer.objects.filter(
+        campaign__start_date__lte=now,
+        campaign__end_date__gte=now
+    ).select_related('campaign', 'product')
+    return list(OfferSerializer(offers, many=True).data)
@@ -0,0 +1,175 @@
+# chatapp/gateway.py
+import asyncio
+import threading
+import time
+import weakref
+from collections import defaultdict, deque
+
+from django.conf import settings
+from ollama import AsyncClient
+
+# latency samples kept per model for the stats endpoint
+LATENCY_WINDOW = 200
+
+
+class GatewayBusy(Exception):
+    """The wait queue is full, reject right away (HTTP 429)."""
+    status_code = 429
+
+
+class GatewayTimeout(Exception):
+    """Queued too long without getting a model slot (HTTP 503)."""
+    status_code = 503
+
+
+class _ModelStats:
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.waits = deque(maxlen=LATENCY_WINDOW)
+
+    def data(self):
+        latencies = sorted(self.latencies)
+        return {
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "in_flight": self.in_flight,
+            "avg_latency": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "p95_latency": round(latencies[int(len(latencies) * 0.95) - 1], 3) if latencies else None,
+            "avg_queue_wait": round(sum(self.waits) / len(self.waits), 3) if self.waits else None,
+        }
+
+
+#one model slot held by a chat request, hand it back with release() (more than once is fine)
+class Lease:
+    def __init__(self, gateway, model, admitted_at):
+        self.gateway = gateway
+        self.model = model
+        self.admitted_at = admitted_at
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.gateway._release(self)
+
+
+class LLMGateway:
+    """
+    Admission control in front of the LLM server. At most ``max_concurrency``
+    chats talk to the model at once, up to ``max_queue`` more wait in FIFO
+    order for ``queue_timeout`` seconds, anything beyond is rejected at once.
+    Slots are shared by every event loop in the process, so the limit holds
+    under ASGI as well as for async views run per request under WSGI.
+    """
+
+    def __init__(self, max_concurrency=None, max_queue=None, queue_timeout=None):
+        self.max_concurrency = max_concurrency or getattr(settings, "CHAT_LLM_MAX_CONCURRENCY", 4)
+        self.max_queue = max_queue if max_queue is not None else getattr(settings, "CHAT_LLM_MAX_QUEUE", 32)
+        self.queue_timeout = queue_timeout or getattr(settings, "CHAT_LLM_QUEUE_TIMEOUT", 10)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._waiters = deque()
+        self._max_queue_seen = 0
+        self._stats = defaultdict(_ModelStats)
+        self._clients = weakref.WeakKeyDictionary()
+
+    def client(self):
+        """The AsyncClient (and its connection pool) of the running event loop."""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = AsyncClient(host=getattr(settings, "CHAT_LLM_HOST", None))
+        return client
+
+    async def acquire(self, model):
+        """Wait for a model slot; raises GatewayBusy or GatewayTimeout instead of piling up."""
+        queued_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            stats = self._stats[model]
+            if self._in_use < self.max_concurrency and not self._waiters:
+                self._in_use += 1
+                return self._admit(model, stats, queued_at)
+            if len(self._waiters) >= self.max_queue:
+                stats.rejected += 1
+                raise GatewayBusy(f"{len(self._waiters)} chats already waiting")
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+            self._max_queue_seen = max(self._max_queue_seen, len(self._waiters))
+
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._abandon(loop, waiter)
+                self._stats[model].timed_out += 1
+            raise GatewayTimeout(f"No model slot within {self.queue_timeout}s")
+        except asyncio.CancelledError:
+            # e.g. the client disconnected while queued
+            with self._lock:
+                self._abandon(loop, waiter)
+            raise
+
+        with self._lock:
+            return self._admit(model, self._stats[model], queued_at)
+
+    def _abandon(self, loop, waiter):
+        """Called under the lock by a waiter that gives up, so no slot is lost with it."""
+        if (loop, waiter) in self._waiters:
+            self._waiters.remove((loop, waiter))
+        elif waiter.done() and not waiter.cancelled():
+            # the slot was granted just before we gave up and no Lease holds it, pass it on
+            self._hand_over()
+        # otherwise the grant is still on its way; _grant finds the waiter done and passes it on
+
+    def _admit(self, model, stats, queued_at):
+        now = time.monotonic()
+        stats.admitted += 1
+        stats.in_flight += 1
+        stats.waits.append(now - queued_at)
+        return Lease(self, model, now)
+
+    def _release(self, lease):
+        with self._lock:
+            stats = self._stats[lease.model]
+            stats.in_flight -= 1
+            stats.latencies.append(time.monotonic() - lease.admitted_at)
+            self._hand_over()
+
+    def _hand_over(self):
+        # called under the lock: the slot goes straight to the oldest waiter, or back to the pool
+        while self._waiters:
+            loop, waiter = self._waiters.popleft()
+            if loop.is_closed():
+                continue
+            loop.call_soon_threadsafe(self._grant, waiter)
+            return
+        self._in_use -= 1
+
+    def _grant(self, waiter):
+        if waiter.done():
+            # the waiter timed out or was cancelled meanwhile, pass the slot on
+            with self._lock:
+                self._hand_over()
+        else:
+            waiter.set_result(True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "queue_timeout": self.queue_timeout,
+                "in_use": self._in_use,
+                "queue_depth": len(self._waiters),
+                "max_queue_depth": self._max_queue_seen,
+                "models": {model: stats.data() for model, stats in self._stats.items()},
+            }
+
+
+llm_gateway = LLMGateway()
@@ -0,0 +1,115 @@
+# chatapp/memory.py
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ChatSession
+
+# rough tokens per character for llama-style tokenizers, good enough for budgeting
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_SNIPPET_CHARS = 80
+
+
+def estimate_tokens(message):
+    return MESSAGE_OVERHEAD_TOKENS + len(message.get("content") or "") // CHARS_PER_TOKEN
+
+
+#one shopper's recent turns plus a one-line digest of what fell out of the window
+class Session:
+    def __init__(self, turns=None, tokens=0, dropped_topics=None):
+        self.turns = turns or []
+        self.tokens = tokens
+        self.dropped_topics = dropped_topics or []
+
+    def append(self, message, token_budget, summary_budget):
+        self.turns.append(message)
+        self.tokens += estimate_tokens(message)
+        # slide the window: oldest turns go first, the newest always stays
+        while self.tokens > token_budget and len(self.turns) > 1:
+            old = self.turns.pop(0)
+            self.tokens -= estimate_tokens(old)
+            if old["role"] == "user":
+                self.dropped_topics.append((old.get("content") or "")[:SUMMARY_SNIPPET_CHARS])
+        # the digest has its own budget, older topics fall off it too
+        while self.dropped_topics and sum(len(t) for t in self.dropped_topics) // CHARS_PER_TOKEN > summary_budget:
+            self.dropped_topics.pop(0)
+
+    def messages(self):
+        if not self.dropped_topics:
+            return list(self.turns)
+        summary = "Earlier in this conversation the user asked about: " + "; ".join(self.dropped_topics)
+        return [{"role": "system", "content": summary}] + self.turns
+
+
+class ConversationStore:
+    """
+    Per-session chat history with a token-budgeted sliding window, kept in
+    ChatSession rows so every worker process sees the same turns. Every
+    turn touches the session's last_used: sessions idle for
+    ``idle_timeout`` expire, and past ``max_sessions`` the least recently
+    used ones are culled whenever a new session starts. Two requests of one
+    session racing each other may drop one of their turns, which only costs
+    the model a little context.
+    """
+
+    def __init__(self, max_sessions=None, token_budget=None, summary_budget=None, idle_timeout=None):
+        self.max_sessions = max_sessions or getattr(settings, "CHAT_MAX_SESSIONS", 5000)
+        self.token_budget = token_budget or getattr(settings, "CHAT_HISTORY_TOKEN_BUDGET", 3000)
+        self.summary_budget = summary_budget or getattr(settings, "CHAT_SUMMARY_TOKEN_BUDGET", 200)
+        self.idle_timeout = idle_timeout or getattr(settings, "CHAT_SESSION_IDLE_TIMEOUT", 30 * 60)
+
+    def _idle_since(self, now):
+        return now - timedelta(seconds=self.idle_timeout)
+
+    def _load(self, session_id, now):
+        row = ChatSession.objects.filter(
+            session_id=session_id, last_used__gt=self._idle_since(now)
+        ).values_list("turns", "tokens", "dropped_topics").first()
+        return Session(*row) if row else Session()
+
+    def _cull(self, now):
+        """Drop expired sessions, then the least recently used beyond max_sessions."""
+        ChatSession.objects.filter(last_used__lte=self._idle_since(now)).delete()
+        cutoff = (
+            ChatSession.objects.order_by("-last_used")
+            .values_list("last_used", flat=True)[self.max_sessions:self.max_sessions + 1]
+            .first()
+        )
+        if cutoff is not None:
+            ChatSession.objects.filter(last_used__lte=cutoff).delete()
+
+    def history(self, session_id):
+        """The messages to send for this session, oldest first."""
+        return self._load(session_id, timezone.now()).messages()
+
+    def append(self, session_id, role, content):
+        now = timezone.now()
+        session = self._load(session_id, now)
+        session.append({"role": role, "content": content}, self.token_budget, self.summary_budget)
+        _, created = ChatSession.objects.update_or_create(
+            session_id=session_id,
+            defaults={
+                "turns": session.turns,
+                "tokens": session.tokens,
+                "dropped_topics": session.dropped_topics,
+                "last_used": now,
+            },
+        )
+        if created:
+            self._cull(now)
+
+    def clear(self, session_id):
+        ChatSession.objects.filter(session_id=session_id).delete()
+
+    # the ORM blocks, async callers run it off the event loop
+    async def ahistory(self, session_id):
+        return await sync_to_async(self.history)(session_id)
+
+    async def aappend(self, session_id, role, content):
+        await sync_to_async(self.append)(session_id, role, content)
+
+
+conversations = ConversationStore()
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatSession',
+            fields=[
+                ('session_id', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('turns', models.JSONField(default=list)),
+                ('tokens', models.PositiveIntegerField(default=0)),
+                ('dropped_topics', models.JSONField(default=list)),
+                ('last_used', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -1,3 +1,16 @@
 from django.db import models
 
 # Create your models here.
+
+
+#chat history of one session, see chatapp/memory.py
+class ChatSession(models.Model):
+    session_id = models.CharField(max_length=255, primary_key=True)
+    turns = models.JSONField(default=list)
+    tokens = models.PositiveIntegerField(default=0)
+    dropped_topics = models.JSONField(default=list)
+    # touched on every turn; idle sessions expire and the least recently used are culled by it
+    last_used = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.session_id
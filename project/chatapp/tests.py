@@ -1,3 +1,92 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from .gateway import GatewayBusy, GatewayTimeout, LLMGateway
+
+
+#admission control: one slot, one queue place, short queue timeout
+class LLMGatewayTests(SimpleTestCase):
+    def setUp(self):
+        self.gateway = LLMGateway(max_concurrency=1, max_queue=1, queue_timeout=0.05)
+
+    async def test_admits_up_to_the_limit(self):
+        lease = await self.gateway.acquire("m")
+
+        stats = self.gateway.stats()
+        self.assertEqual(stats["in_use"], 1)
+        self.assertEqual(stats["models"]["m"]["admitted"], 1)
+
+        lease.release()
+        lease.release()
+        self.assertEqual(self.gateway.stats()["in_use"], 0)
+
+    async def test_queued_chat_gets_the_released_slot(self):
+        lease = await self.gateway.acquire("m")
+        waiting = asyncio.create_task(self.gateway.acquire("m"))
+        await asyncio.sleep(0)
+        self.assertEqual(self.gateway.stats()["queue_depth"], 1)
+
+        lease.release()
+        second = await waiting
+
+        self.assertEqual(self.gateway.stats()["in_use"], 1)
+        second.release()
+        self.assertEqual(self.gateway.stats()["in_use"], 0)
+
+    async def test_full_queue_is_rejected(self):
+        lease = await self.gateway.acquire("m")
+        waiting = asyncio.create_task(self.gateway.acquire("m"))
+        await asyncio.sleep(0)
+
+        with self.assertRaises(GatewayBusy):
+            await self.gateway.acquire("m")
+        self.assertEqual(self.gateway.stats()["models"]["m"]["rejected"], 1)
+
+        lease.release()
+        (await waiting).release()
+
+    async def test_queue_timeout_does_not_leak_the_slot(self):
+        lease = await self.gateway.acquire("m")
+
+        with self.assertRaises(GatewayTimeout):
+            await self.gateway.acquire("m")
+
+        stats = self.gateway.stats()
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(stats["models"]["m"]["timed_out"], 1)
+
+        lease.release()
+        self.assertEqual(self.gateway.stats()["in_use"], 0)
+        (await self.gateway.acquire("m")).release()
+
+    async def test_cancelled_waiter_leaves_no_trace(self):
+        lease = await self.gateway.acquire("m")
+        waiting = asyncio.create_task(self.gateway.acquire("m"))
+        await asyncio.sleep(0)
+
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+
+        self.assertEqual(self.gateway.stats()["queue_depth"], 0)
+        lease.release()
+        self.assertEqual(self.gateway.stats()["in_use"], 0)
+
+    async def test_slot_granted_to_a_cancelled_waiter_is_passed_on(self):
+        async def granted_then_cancelled(waiter, timeout):
+            # the client goes away right after the slot was handed over, before a Lease exists
+            await waiter
+            raise asyncio.CancelledError
+
+        lease = await self.gateway.acquire("m")
+        with mock.patch("chatapp.gateway.asyncio.wait_for", granted_then_cancelled):
+            waiting = asyncio.create_task(self.gateway.acquire("m"))
+            await asyncio.sleep(0)
+            lease.release()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+
+        self.assertEqual(self.gateway.stats()["in_use"], 0)
+        (await self.gateway.acquire("m")).release()
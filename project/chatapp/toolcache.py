@@ -0,0 +1,101 @@
+# chatapp/toolcache.py
+import hashlib
+import inspect
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+
+from products.cache import catalog_timeout, catalog_version
+
+DEFAULT_TTL = 60  # seconds
+
+
+def _cache():
+    # same alias as the catalog version key, so a catalog/offer write invalidates tool results too
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def _incr(cache, key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+def _normalize(value):
+    """The model sends ids as 3, "3" or " 3 "; they are all the same question."""
+    if isinstance(value, str):
+        value = value.strip()
+        return int(value) if value.isdigit() else value.lower()
+    return value
+
+
+def tool_ttl(name):
+    return getattr(settings, 'CHAT_TOOL_CACHE_TTLS', {}).get(name, DEFAULT_TTL)
+
+
+#cache of chat tool results under the catalog version, per-tool TTL
+def cached_tool(name):
+    """
+    Cache what a catalog read returns, keyed by ``name`` plus its normalized
+    arguments. Entries live for the tool's TTL (CHAT_TOOL_CACHE_TTLS), never
+    past the next campaign boundary, and are dropped when the catalog version
+    moves on a catalog or offer change.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = json.dumps(
+                {key: _normalize(value) for key, value in bound.arguments.items()},
+                sort_keys=True, default=str,
+            )
+            key = f"chattool:{catalog_version()}:{name}:{hashlib.md5(arguments.encode()).hexdigest()}"
+
+            cache = _cache()
+            cached = cache.get(key)
+            if cached is not None:
+                _incr(cache, f"chattool:stats:{name}:hits")
+                return cached[0]
+
+            _incr(cache, f"chattool:stats:{name}:misses")
+            result = func(**{k: _normalize(v) for k, v in bound.arguments.items()})
+            # wrapped in a tuple so a None result is cached as well
+            cache.set(key, (result,), timeout=catalog_timeout(tool_ttl(name)))
+            return result
+
+        return wrapper
+    return decorator
+
+
+def tool_cache_stats():
+    """Hits, misses and hit rate per chat tool plus overall."""
+    cache = _cache()
+    names = list(getattr(settings, 'CHAT_TOOL_CACHE_TTLS', {}))
+    counters = cache.get_many(
+        [f"chattool:stats:{name}:{kind}" for name in names for kind in ('hits', 'misses')]
+    )
+    tools = {}
+    for name in names:
+        hits = counters.get(f"chattool:stats:{name}:hits", 0)
+        misses = counters.get(f"chattool:stats:{name}:misses", 0)
+        total = hits + misses
+        tools[name] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "ttl": tool_ttl(name),
+        }
+    hits = sum(tool["hits"] for tool in tools.values())
+    total = hits + sum(tool["misses"] for tool in tools.values())
+    return {
+        "version": catalog_version(),
+        "hit_rate": round(hits / total, 4) if total else 0.0,
+        "tools": tools,
+    }
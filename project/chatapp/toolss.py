@@ -1,10 +1,20 @@
 # chatapp/tools.py
 import requests
+from django.conf import settings
+from django.db import DatabaseError
 from langchain.tools import tool
 from pydantic import BaseModel
 from typing import List, Optional
 
-BASE_URL = "http://127.0.0.1:8000/products"  # make sure your Django server runs here
+from . import catalog
+
+# only used when CHAT_TOOLS_MODE = "http"
+BASE_URL = getattr(settings, "CHAT_TOOLS_BASE_URL", "http://127.0.0.1:8000/products")
+
+
+def use_http():
+    """Tools read the ORM in-process unless CHAT_TOOLS_MODE is "http" (e.g. the agent runs elsewhere)."""
+    return getattr(settings, "CHAT_TOOLS_MODE", "orm") == "http"
 
 # ----------------------------
 # Input Schemas for tools
@@ -24,6 +34,11 @@ def get_categories() -> List[dict]:
     """Fetch all active categories.
     it answers question like what products do you have?
     what type of eccomerce store are you?"""
+    if not use_http():
+        try:
+            return catalog.categories()
+        except DatabaseError as e:
+            return [{"error": f"Failed to fetch categories: {e}"}]
     try:
         resp = requests.get(f"{BASE_URL}/categories/")
         resp.raise_for_status()
@@ -39,16 +54,24 @@ def get_products(category: Optional[int] = None, subcategory: Optional[int] = No
     """Fetch products, optionally filtered by category/subcategory.
     it answers question like what shoes do you have?
     """
+    if not use_http():
+        try:
+            return catalog.products(category, subcategory)
+        except DatabaseError as e:
+            return [{"error": f"Failed to fetch products: {e}"}]
     try:
-        params = {}
+        # same sample as the ORM path: the first page of product_list, unwrapped from {next, previous, results}
+        params = {"page_size": catalog.CHAT_PRODUCT_LIMIT}
         if category: params["category"] = category
         if subcategory: params["subcategory"] = subcategory
 
         resp = requests.get(f"{BASE_URL}/products/", params=params)
         resp.raise_for_status()
-        return resp.json()
+        return resp.json()["results"]
     except requests.RequestException as e:
         return [{"error": f"Failed to fetch products: {e}"}]
+    except (KeyError, TypeError):
+        return [{"error": "API returned an unexpected payload"}]
     except ValueError:
         return [{"error": "API returned invalid JSON"}]
 
@@ -59,6 +82,11 @@ def get_product_detail(product_id: int) -> dict:
     it answers question like do you have red shoes in size 9?
     answers questions like do yuo have mum jeans in stock? what is the price of nike air max 90? what is the description of adidas ultraboost?
     """
+    if not use_http():
+        try:
+            return catalog.product_detail(product_id) or {"error": "Product not found"}
+        except DatabaseError as e:
+            return {"error": f"Failed to fetch product detail: {e}"}
     try:
         resp = requests.get(f"{BASE_URL}/products/{product_id}/")
         resp.raise_for_status()
@@ -72,6 +100,11 @@ def get_product_detail(product_id: int) -> dict:
 @tool(args_schema=None)
 def get_active_offers() -> List[dict]:
     """Fetch all currently active offers."""
+    if not use_http():
+        try:
+            return catalog.active_offers()
+        except DatabaseError as e:
+            return [{"error": f"Failed to fetch offers: {e}"}]
     try:
         resp = requests.get(f"{BASE_URL}/offers/")
         resp.raise_for_status()
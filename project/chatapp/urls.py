@@ -1,7 +1,10 @@
 # chatapp/urls.py
 from django.urls import path
-from .views import chat_view
+from .views import chat_view, chat_stream_view, chat_tool_cache_stats, chat_llm_stats
 
 urlpatterns = [
     path("chat/", chat_view, name="chat"),
+    path("chat/stream/", chat_stream_view, name="chat-stream"),
+    path("chat/tool-cache-stats/", chat_tool_cache_stats, name="chat-tool-cache-stats"),
+    path("chat/llm-stats/", chat_llm_stats, name="chat-llm-stats"),
 ]
@@ -1,20 +1,137 @@
+import json
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
-from rest_framework.decorators import api_view
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .agent import MODEL, ask_agent, stream_agent
+from .gateway import GatewayBusy, GatewayTimeout, llm_gateway
+from .toolcache import tool_cache_stats
+
+
+def chat_session_id(user, data):
+    """Logged-in users keep one history; guests send back the session_id we gave them."""
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}", None
+    session_id = str(data.get("session_id") or uuid.uuid4())
+    return f"guest:{session_id}", session_id
 
-from .agent import run_agent
 
-@api_view(["POST"])
-def chat_view(request):
-    user_message = request.data.get("message")
+def _jwt_user(request):
+    authenticated = JWTAuthentication().authenticate(request)
+    return authenticated[0] if authenticated else None
+
+
+async def _chat_request(request):
+    """(message, session key, guest session id, lease) or an error JsonResponse."""
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Body must be JSON"}, status=400)
 
+    user_message = data.get("message")
     if not user_message:
-        return Response({"error": "Message is required"}, status=status.HTTP_400_BAD_REQUEST)
+        return JsonResponse({"error": "Message is required"}, status=400)
 
+    user = await request.auser()
+    if not user.is_authenticated:
+        try:
+            user = await sync_to_async(_jwt_user)(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({"error": str(e.detail)}, status=401)
+
+    # 🔹 Admission control: wait briefly for a model slot or turn the request away
     try:
-        # Use "input" key, not "messages"
-        result = run_agent.invoke({"input": user_message})
-        return Response({"response": result.get("output", "")})
-    except Exception as e:
-        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        lease = await llm_gateway.acquire(MODEL)
+    except (GatewayBusy, GatewayTimeout) as e:
+        response = JsonResponse({"error": "Chat is busy, please retry shortly"}, status=e.status_code)
+        response["Retry-After"] = "5"
+        return response
+
+    session_key, session_id = chat_session_id(user, data)
+    return user_message, session_key, session_id, lease
+
+
+# async so a chat waiting on the model holds no web worker under ASGI (project.asgi)
+@csrf_exempt
+async def chat_view(request):
+    parsed = await _chat_request(request)
+    if isinstance(parsed, JsonResponse):
+        return parsed
+    user_message, session_key, session_id, lease = parsed
+
+    try:
+        reply = await ask_agent(user_message, session_id=session_key, lease=lease)
+    finally:
+        # also when the request is cancelled before the agent finishes
+        lease.release()
+    data = {"response": reply}
+    if session_id:
+        data["session_id"] = session_id
+    return JsonResponse(data)
+
+
+#hit rates of the chat tool result cache
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def chat_tool_cache_stats(request):
+    return Response(tool_cache_stats())
+
+
+#model latency and queue depth of the LLM gateway
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def chat_llm_stats(request):
+    return Response(llm_gateway.stats())
+
+
+#streaming chat: server-sent events straight from the model, run it under ASGI (project.asgi)
+def sse_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class LeasedStreamingResponse(StreamingHttpResponse):
+    """A stream that hands its model slot back when Django closes the response, started or not."""
+
+    def __init__(self, *args, lease, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lease = lease
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.lease.release()
+
+
+async def _sse(events, session_id):
+    if session_id:
+        yield sse_event("session", {"session_id": session_id})
+    async for name, data in events:
+        yield sse_event(name, data)
+
+
+@csrf_exempt
+async def chat_stream_view(request):
+    parsed = await _chat_request(request)
+    if isinstance(parsed, JsonResponse):
+        return parsed
+    user_message, session_key, session_id, lease = parsed
+
+    response = LeasedStreamingResponse(
+        _sse(stream_agent(user_message, session_id=session_key, lease=lease), session_id),
+        content_type="text/event-stream",
+        lease=lease,
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+    return response
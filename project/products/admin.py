@@ -50,8 +50,13 @@ class ProductAdmin(nested_admin.NestedModelAdmin):
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
-    readonly_fields = ('price', 'total')  # auto-calculated, not editable
-    fields = ('product', 'quantity', 'size', 'color', 'price', 'total')  # order of fields
+    # the snapshot columns, so the inline never joins the live catalog
+    readonly_fields = ('product_name', 'size', 'color', 'hex_code', 'price', 'total')
+    fields = ('product_name', 'quantity', 'size', 'color', 'hex_code', 'price', 'total')  # order of fields
+
+    # lines come from the cart, the variant picker would load the whole catalog
+    def has_add_permission(self, request, obj=None):
+        return False
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
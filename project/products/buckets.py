@@ -0,0 +1,176 @@
+import random
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import MainOffer, ProductSizeColor, StockBucket, StockHold
+
+SYNC_BATCH_SIZE = 500
+
+
+def bucketed_variants(variant_ids):
+    """{variant_id: bucket count} for the variants in flash-sale mode, no row locks taken."""
+    return dict(
+        ProductSizeColor.objects.filter(pk__in=variant_ids, stock_buckets__gt=0)
+        .values_list('pk', 'stock_buckets')
+    )
+
+
+def _spread(total, count):
+    """Split ``total`` units as evenly as possible over ``count`` buckets."""
+    share, extra = divmod(total, count)
+    return [share + (1 if slot < extra else 0) for slot in range(count)]
+
+
+def _respread(variant_id, change, clamp=False):
+    """
+    Lock every bucket of a variant in slot order, the one order all
+    multi-bucket writers use, and spread their total plus ``change`` evenly
+    over them. A total that would go negative is left alone, or floored at
+    zero with ``clamp``. Returns the total found before the change.
+    """
+    with transaction.atomic():
+        buckets = list(
+            StockBucket.objects.select_for_update().filter(variant_id=variant_id)
+            .order_by('slot').values_list('pk', 'quantity')
+        )
+        if not buckets:
+            return 0
+        total = sum(quantity for _, quantity in buckets)
+        if total + change < 0 and not clamp:
+            return total
+        spread = _spread(max(total + change, 0), len(buckets))
+        StockBucket.objects.filter(variant_id=variant_id).update(quantity=Case(
+            *[When(pk=pk, then=Value(share)) for (pk, _), share in zip(buckets, spread)],
+            output_field=IntegerField(),
+        ))
+    return total
+
+
+def rebalance_buckets(variant_id):
+    """Even out a variant's buckets so none sits dry while others hold stock. Returns the total."""
+    return _respread(variant_id, 0)
+
+
+def take_from_buckets(variant_id, quantity):
+    """
+    Take ``quantity`` units with a guarded single-row UPDATE on a random
+    bucket that covers the whole take, so concurrent buyers spread over the
+    buckets and each holds one bucket lock. Only when no single bucket
+    covers it are all the variant's buckets locked in slot order and the
+    take made from their total, which also rebalances them. Returns False
+    when the variant is sold out for this quantity.
+    """
+    candidates = list(
+        StockBucket.objects.filter(variant_id=variant_id, quantity__gte=quantity)
+        .values_list('pk', flat=True)
+    )
+    random.shuffle(candidates)
+    for pk in candidates:
+        if StockBucket.objects.filter(pk=pk, quantity__gte=quantity).update(quantity=F('quantity') - quantity):
+            return True
+    return _respread(variant_id, -quantity) >= quantity
+
+
+def apply_quantity_edit(variant, stored_quantity):
+    """
+    quantity of a bucketed variant is rewritten from its buckets by
+    sync_bucketed_stock, so an edit made to it (admin, API) goes into the
+    buckets as a delta instead of being lost on the next sync. Lowering it
+    by more than the buckets hold empties them.
+    """
+    change = variant.quantity - stored_quantity
+    if change:
+        _respread(variant.pk, change, clamp=True)
+
+
+def return_to_buckets(variant_id, bucket_count, quantity):
+    """Give ``quantity`` units back to a random bucket."""
+    StockBucket.objects.filter(variant_id=variant_id, slot=random.randrange(bucket_count)).update(
+        quantity=F('quantity') + quantity
+    )
+
+
+def _held():
+    return (
+        StockHold.objects.filter(variant=OuterRef('pk'))
+        .values('variant').annotate(sum=Sum('quantity')).values('sum')
+    )
+
+
+def _in_buckets():
+    return (
+        StockBucket.objects.filter(variant=OuterRef('pk'))
+        .values('variant').annotate(sum=Sum('quantity')).values('sum')
+    )
+
+
+def bucket_stock():
+    """Annotation for a ProductSizeColor queryset: the live unheld units in its buckets."""
+    return Coalesce(Subquery(_in_buckets()), Value(0))
+
+
+def sync_bucketed_stock(variant_ids=None):
+    """
+    Write the bucket totals back to quantity (buckets + held) and reserved
+    (held) of bucketed variants in one UPDATE per batch; Product.stock follows
+    through the usual on-commit refresh. Returns how many variants were synced.
+    """
+    variants = ProductSizeColor.objects.filter(stock_buckets__gt=0)
+    if variant_ids is not None:
+        variants = variants.filter(pk__in=variant_ids)
+    ids = list(variants.order_by('pk').values_list('pk', flat=True))
+
+    held = Coalesce(Subquery(_held()), Value(0))
+    for start in range(0, len(ids), SYNC_BATCH_SIZE):
+        ProductSizeColor.objects.filter(pk__in=ids[start:start + SYNC_BATCH_SIZE]).update(
+            quantity=bucket_stock() + held,
+            reserved=held,
+        )
+    return len(ids)
+
+
+def rebalance_dry_buckets():
+    """Rebalance every bucketed variant that has an empty bucket while another could share."""
+    dry = StockBucket.objects.filter(quantity=0).values('variant_id')
+    stocked = set(
+        StockBucket.objects.filter(variant_id__in=dry, quantity__gt=1)
+        .values_list('variant_id', flat=True).distinct()
+    )
+    for variant_id in sorted(stocked):
+        rebalance_buckets(variant_id)
+    return len(stocked)
+
+
+def shard_variant(variant_id, bucket_count):
+    """Move a variant into flash-sale mode: its unheld units are spread over ``bucket_count`` buckets."""
+    with transaction.atomic():
+        variant = ProductSizeColor.objects.select_for_update().get(pk=variant_id)
+        if variant.stock_buckets:
+            unshard_variant(variant_id)
+            variant.refresh_from_db()
+
+        StockBucket.objects.bulk_create([
+            StockBucket(variant_id=variant_id, slot=slot, quantity=share)
+            for slot, share in enumerate(_spread(variant.available_quantity, bucket_count))
+        ])
+        ProductSizeColor.objects.filter(pk=variant_id).update(stock_buckets=bucket_count)
+
+
+def unshard_variant(variant_id):
+    """Fold the buckets back into the variant row and leave flash-sale mode."""
+    with transaction.atomic():
+        list(ProductSizeColor.objects.select_for_update().filter(pk=variant_id).values_list('pk'))
+        sync_bucketed_stock([variant_id])
+        StockBucket.objects.filter(variant_id=variant_id).delete()
+        ProductSizeColor.objects.filter(pk=variant_id).update(stock_buckets=0)
+
+
+def campaign_variant_ids(campaign_id):
+    """Every variant of every product on offer in a MainOffer campaign."""
+    campaign = MainOffer.objects.get(pk=campaign_id)
+    return list(
+        ProductSizeColor.objects.filter(product_size__product__offers__campaign=campaign)
+        .distinct().values_list('pk', flat=True)
+    )
@@ -0,0 +1,151 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import MainOffer
+
+VERSION_KEY = 'catalog:version'
+CHANGED_AT_KEY = 'catalog:changed_at'
+DOCUMENTS_VERSION_KEY = 'catalog:documents'
+HITS_KEY = 'catalog:stats:hits'
+MISSES_KEY = 'catalog:stats:misses'
+
+
+def _cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def _state_cache():
+    """
+    Where the version counters and the change marker live. Every worker
+    must read the same values, or ETags differ per process and a change made
+    in one process never moves Last-Modified in another.
+    """
+    return caches[getattr(settings, 'CATALOG_STATE_CACHE_ALIAS', 'default')]
+
+
+def _incr(key, cache=None):
+    cache = cache or _cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # missing or evicted, start again
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+def _version(key):
+    cache = _state_cache()
+    version = cache.get(key)
+    if version is None:
+        # seeded from the clock so an evicted counter never goes back to an old value
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def catalog_version():
+    return _version(VERSION_KEY)
+
+
+def catalog_changed_at():
+    """When the catalog version last moved. A missing marker reads as now, so it never goes back."""
+    cache = _state_cache()
+    changed_at = cache.get(CHANGED_AT_KEY)
+    if changed_at is None:
+        cache.add(CHANGED_AT_KEY, timezone.now(), timeout=None)
+        changed_at = cache.get(CHANGED_AT_KEY) or timezone.now()
+    return changed_at
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response by moving to a new version."""
+    catalog_version()
+    _incr(VERSION_KEY, _state_cache())
+    _state_cache().set(CHANGED_AT_KEY, timezone.now(), timeout=None)
+
+
+def bump_catalog_version_on_commit():
+    transaction.on_commit(bump_catalog_version, robust=True)
+
+
+def documents_version():
+    """Moves whenever a ProductDocument is written or deleted, so readers of the documents can skip a DB check."""
+    return _version(DOCUMENTS_VERSION_KEY)
+
+
+def bump_documents_version():
+    documents_version()
+    _incr(DOCUMENTS_VERSION_KEY, _state_cache())
+
+
+def _seconds_to_next_campaign_boundary(now):
+    """Offers switch on/off without any write, so entries must not outlive the next start or end."""
+    boundary = MainOffer.objects.filter(
+        Q(start_date__gt=now) | Q(end_date__gte=now)
+    ).aggregate(
+        next_start=Min('start_date', filter=Q(start_date__gt=now)),
+        next_end=Min('end_date', filter=Q(end_date__gte=now)),
+    )
+    upcoming = [moment for moment in boundary.values() if moment is not None]
+    if not upcoming:
+        return None
+    return max(int((min(upcoming) - now).total_seconds()), 1)
+
+
+def catalog_timeout(timeout, now=None):
+    """``timeout`` shortened so a cached catalog entry never outlives the next campaign start/end."""
+    until_boundary = _seconds_to_next_campaign_boundary(now or timezone.now())
+    if until_boundary is not None:
+        timeout = min(timeout, until_boundary)
+    return timeout
+
+
+def cache_stats():
+    cache = _cache()
+    hits = cache.get(HITS_KEY) or 0
+    misses = cache.get(MISSES_KEY) or 0
+    total = hits + misses
+    return {
+        "version": catalog_version(),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else 0.0,
+    }
+
+
+def catalog_cache(view):
+    """
+    Cache the response data of a read-only catalog view under the current
+    catalog version. Goes below @api_view so it sees DRF requests and responses.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return view(request, *args, **kwargs)
+
+        cache = _cache()
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        key = f"catalog:{catalog_version()}:{view.__name__}:{path}"
+
+        data = cache.get(key)
+        if data is not None:
+            _incr(HITS_KEY, cache)
+            return Response(data)
+
+        _incr(MISSES_KEY, cache)
+        response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            timeout = catalog_timeout(getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+            cache.set(key, response.data, timeout=timeout)
+        return response
+
+    return wrapper
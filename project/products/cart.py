@@ -0,0 +1,197 @@
+import time
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .buckets import bucket_stock
+from .models import ProductSizeColor
+from .offers import ActiveOfferResolver
+
+# a writer that dies holding a cart lock blocks that cart at most this long
+CART_LOCK_TIMEOUT = 5  # seconds
+CART_LOCK_WAIT = 3  # seconds a request waits for a cart another request is changing
+CART_LOCK_POLL = 0.01  # seconds
+
+
+class CartBusy(Exception):
+    """Another request kept the cart locked for longer than CART_LOCK_WAIT."""
+
+
+def cart_cache():
+    return caches[getattr(settings, 'CART_CACHE_ALIAS', 'default')]
+
+
+def cart_ttl():
+    return getattr(settings, 'CART_TTL', 30 * 24 * 60 * 60)
+
+
+#a user's cart lives in the cache until checkout turns it into an Order
+class CartStore:
+    """
+    {variant_id: {"quantity": int, "price": str, "offer": id or None}} under
+    one key per user. ``price`` and ``offer`` are what the customer saw when
+    adding the line, so reads can flag price changes and expired offers.
+
+    Writes go through ``update()``, which holds a per-user lock taken with
+    ``cache.add`` around the load and save, so concurrent adds never drop
+    each other's lines. Only the Django cache API is used; the backend must
+    be shared by every worker and have an atomic ``add`` (database, Redis,
+    memcached).
+    """
+
+    def __init__(self, user):
+        self.key = f"cart:{user.pk}"
+        self.lock_key = f"cart:{user.pk}:lock"
+
+    def load(self):
+        return cart_cache().get(self.key) or {}
+
+    def save(self, lines):
+        if lines:
+            cart_cache().set(self.key, lines, cart_ttl())
+        else:
+            cart_cache().delete(self.key)
+
+    @contextmanager
+    def update(self):
+        """Lock the cart and yield its lines; changes made to them are saved on exit."""
+        cache = cart_cache()
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + CART_LOCK_WAIT
+        while not cache.add(self.lock_key, token, CART_LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                raise CartBusy(self.key)
+            time.sleep(CART_LOCK_POLL)
+        try:
+            lines = self.load()
+            yield lines
+            self.save(lines)
+        finally:
+            if cache.get(self.lock_key) == token:
+                cache.delete(self.lock_key)
+
+    def add(self, variant_id, quantity, price, offer_id=None):
+        with self.update() as lines:
+            add_line(lines, variant_id, quantity, price, offer_id)
+        return lines
+
+    def remove(self, variant_id):
+        with self.update() as lines:
+            lines.pop(variant_id, None)
+        return lines
+
+    def clear(self):
+        with self.update() as lines:
+            lines.clear()
+
+
+def add_line(lines, variant_id, quantity, price, offer_id=None):
+    """Add ``quantity`` of a variant to cart ``lines`` at the price the customer sees now."""
+    line = lines.setdefault(variant_id, {"quantity": 0})
+    line["quantity"] += quantity
+    line["price"] = str(price)
+    line["offer"] = offer_id
+
+
+def load_variants(variant_ids):
+    """Every variant of a cart with its size, product and live flash-sale bucket stock, in one query."""
+    return (
+        ProductSizeColor.objects.select_related('product_size__product')
+        .annotate(bucket_stock=bucket_stock())
+        .in_bulk(variant_ids)
+    )
+
+
+def current_price(product, resolver):
+    """(price, offer id) the product sells at now: its best active offer, else the list price."""
+    offer = resolver.get(product.id)
+    if offer is not None:
+        return offer.new_price, offer.id
+    return product.price, None
+
+
+#what a cart looks like against the live catalog, and how to fix it
+class CartCheck:
+    """
+    ``items`` are the display lines, ``diffs`` one entry per correction
+    ("unavailable", "out_of_stock", "quantity_reduced", "price_changed",
+    "offer_expired") and ``lines`` the corrected cart in CartStore format.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.diffs = []
+        self.lines = {}
+        self.total = Decimal('0')
+
+    @property
+    def valid(self):
+        return not self.diffs
+
+    def data(self):
+        return {
+            "items": self.items,
+            "total_price": str(self.total),
+            "valid": self.valid,
+            "changes": self.diffs,
+        }
+
+
+def revalidate_cart(lines, variants=None, now=None):
+    """
+    Reprice and restock a cart in a fixed number of queries: one for the
+    variants with their products, plus the shared active-offer snapshot.
+    Lines are clamped to the unreserved stock and priced at the current
+    offer or list price; nothing is written.
+    """
+    if variants is None:
+        variants = load_variants(list(lines))
+    resolver = ActiveOfferResolver(now)
+    check = CartCheck()
+
+    for variant_id, line in sorted(lines.items()):
+        variant = variants.get(variant_id)
+        if variant is None:
+            check.diffs.append({"product_variant": variant_id, "change": "unavailable"})
+            continue
+
+        quantity = min(line["quantity"], variant.available_quantity)
+        if quantity == 0:
+            check.diffs.append({"product_variant": variant_id, "change": "out_of_stock"})
+            continue
+        if quantity < line["quantity"]:
+            check.diffs.append({
+                "product_variant": variant_id, "change": "quantity_reduced",
+                "old": line["quantity"], "new": quantity,
+            })
+
+        product = variant.product_size.product
+        price, offer_id = current_price(product, resolver)
+        seen_offer = line.get("offer")
+        if seen_offer is not None and seen_offer != offer_id:
+            check.diffs.append({"product_variant": variant_id, "change": "offer_expired", "offer": seen_offer})
+        if Decimal(line["price"]) != price:
+            check.diffs.append({
+                "product_variant": variant_id, "change": "price_changed",
+                "old": line["price"], "new": str(price),
+            })
+
+        check.lines[variant_id] = {"quantity": quantity, "price": str(price), "offer": offer_id}
+        check.total += price * quantity
+        check.items.append({
+            "product_variant": variant_id,
+            "product_name": product.name,
+            "product_slug": product.slug,
+            "size": variant.product_size.waist_shoe_size,
+            "color": variant.color_name,
+            "hex_code": variant.hex_code or '',
+            "quantity": quantity,
+            "available": variant.available_quantity,
+            "price": str(price),
+            "offer": offer_id,
+            "total": str(price * quantity),
+        })
+    return check
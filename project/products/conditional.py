@@ -0,0 +1,108 @@
+import hashlib
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from .cache import catalog_changed_at, catalog_version
+from .documents import catalog_documents
+from .models import Category, MainOffer, Offer, ProductDocument
+
+
+def _etag(*parts):
+    return hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _latest(*moments):
+    moments = [moment for moment in moments if moment is not None]
+    return max(moments) if moments else None
+
+
+def offer_epoch(now):
+    """The last campaign start or end that has already passed, i.e. when the set of live offers last changed."""
+    passed = MainOffer.objects.aggregate(
+        last_start=Max('start_date', filter=Q(start_date__lte=now)),
+        last_end=Max('end_date', filter=Q(end_date__lt=now)),
+    )
+    return _latest(*passed.values())
+
+
+def _document_state(documents, now):
+    """
+    Newest build, latest offer boundary already passed and row count of a
+    document set in one aggregate. Read-only: a document whose boundary has
+    passed counts as changed at that moment, the view rebuilds it.
+    """
+    return documents.aggregate(
+        built_at=Max('built_at'),
+        stale_at=Max('valid_until', filter=Q(valid_until__lte=now)),
+        count=Count('pk'),
+    )
+
+
+def conditional_catalog(validators):
+    """
+    Wrap a catalog view with ETag / Last-Modified handling. ``validators``
+    returns (etag, last_modified) from cheap read-only aggregates, or
+    (None, None) to skip; a matching request gets a 304 before the view or
+    its serializers run. Goes above @api_view.
+
+    Last-Modified never goes below the last catalog version bump, so a
+    product or offer that was deleted or made unavailable (which leaves no
+    newer row behind) still moves it forward.
+    """
+    def memo(request, *args, **kwargs):
+        if not hasattr(request, '_catalog_validators'):
+            request._catalog_validators = validators(request, *args, **kwargs)
+        return request._catalog_validators
+
+    return condition(
+        etag_func=lambda request, *args, **kwargs: memo(request, *args, **kwargs)[0],
+        last_modified_func=lambda request, *args, **kwargs: memo(request, *args, **kwargs)[1],
+    )
+
+
+def product_detail_validators(request, pk):
+    row = ProductDocument.objects.filter(product_id=pk).values_list('built_at', 'valid_until', 'available').first()
+    if row is None:
+        return None, None
+    built_at, valid_until, available = row
+    if not available or (valid_until and valid_until <= timezone.now()):
+        # 404 or a price change pending, let the view deal with it
+        return None, None
+    return _etag('product', pk, built_at.isoformat()), built_at
+
+
+def product_list_validators(request):
+    now = timezone.now()
+    state = _document_state(catalog_documents(request.GET), now)
+    last_modified = _latest(state['built_at'], state['stale_at'], catalog_changed_at())
+    return _etag('products', request.get_full_path(), state['built_at'], state['stale_at'], state['count']), last_modified
+
+
+def category_detail_validators(request, slug):
+    category_id = Category.objects.filter(slug=slug, is_active=True).values_list('id', flat=True).first()
+    if category_id is None:
+        return None, None
+    now = timezone.now()
+    state = _document_state(ProductDocument.objects.filter(category_id=category_id), now)
+    # category/subcategory rows carry no timestamp, the catalog version covers them
+    last_modified = _latest(state['built_at'], state['stale_at'], catalog_changed_at())
+    return _etag('category', slug, catalog_version(), state['built_at'], state['stale_at'], state['count']), last_modified
+
+
+def active_offer_validators(request):
+    now = timezone.now()
+    state = Offer.objects.filter(
+        campaign__start_date__lte=now,
+        campaign__end_date__gte=now
+    ).aggregate(
+        count=Count('id'),
+        offer_at=Max('updated_at'),
+        campaign_at=Max('campaign__updated_at'),
+        product_at=Max('product__document__built_at'),
+    )
+    epoch = offer_epoch(now)
+    # deleted offers leave no updated_at behind, the version bump they caused does
+    last_modified = _latest(state['offer_at'], state['campaign_at'], state['product_at'], epoch, catalog_changed_at())
+    return _etag('offers', request.path, state['count'], last_modified, epoch), last_modified
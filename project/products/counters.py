@@ -0,0 +1,192 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+
+from .models import Product, ProductCounterDelta, ProductDocument
+
+logger = logging.getLogger(__name__)
+
+APPLY_CHUNK_SIZE = 500
+
+
+def _flush_interval():
+    return getattr(settings, 'PRODUCT_COUNTER_FLUSH_INTERVAL', 10)
+
+
+def _max_pending():
+    return getattr(settings, 'PRODUCT_COUNTER_MAX_PENDING', 1000)
+
+
+#in-process write-behind buffer for views_count / likes_count
+class CounterBuffer:
+    """
+    Hits only touch a dict. A daemon thread drains the buffer into
+    ProductCounterDelta rows (one INSERT) and applies them every
+    FLUSH_INTERVAL seconds, or as soon as MAX_PENDING hits are buffered, so
+    no request ever pays for a flush and an idle process still writes its
+    counts. A crash loses at most that much per process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(lambda: [0, 0])
+        self._hits = 0
+        self._wake = threading.Event()
+        self._flusher = None
+
+    def add(self, product_id, views=0, likes=0):
+        with self._lock:
+            counts = self._pending[product_id]
+            counts[0] += views
+            counts[1] += likes
+            self._hits += 1
+            full = self._hits >= _max_pending()
+            # started on first use (and again in a forked worker), not at import
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._run, name='product-counter-flusher', daemon=True)
+                self._flusher.start()
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(_flush_interval())
+            self._wake.clear()
+            try:
+                self.drain()
+                apply_counter_deltas()
+            except Exception:
+                logger.exception("Flushing product counters failed")
+            finally:
+                close_old_connections()
+
+    def has_pending(self):
+        with self._lock:
+            return bool(self._pending)
+
+    def drain(self):
+        """Write the buffered increments to the delta table."""
+        with self._lock:
+            pending = self._pending
+            self._pending = defaultdict(lambda: [0, 0])
+            self._hits = 0
+        if not pending:
+            return
+        try:
+            ProductCounterDelta.objects.bulk_create([
+                ProductCounterDelta(product_id=product_id, views=views, likes=likes)
+                for product_id, (views, likes) in pending.items()
+            ])
+        except Exception:
+            # keep the hits for the next flush
+            with self._lock:
+                for product_id, (views, likes) in pending.items():
+                    counts = self._pending[product_id]
+                    counts[0] += views
+                    counts[1] += likes
+            raise
+
+
+def _delta_case(deltas, index):
+    return Case(
+        *[When(pk=product_id, then=Value(counts[index])) for product_id, counts in deltas.items()],
+        default=Value(0),
+        output_field=PositiveIntegerField(),
+    )
+
+
+def apply_counter_deltas():
+    """
+    Fold pending delta rows into Product with one
+    ``views_count = views_count + CASE ...`` UPDATE per chunk of products.
+    Returns the number of products touched.
+    """
+    with transaction.atomic():
+        # skip rows another worker is already applying
+        rows = list(
+            ProductCounterDelta.objects.select_for_update(skip_locked=True)
+            .values_list('id', 'product_id', 'views', 'likes')
+        )
+        if not rows:
+            return 0
+
+        deltas = defaultdict(lambda: [0, 0])
+        for _, product_id, views, likes in rows:
+            deltas[product_id][0] += views
+            deltas[product_id][1] += likes
+
+        product_ids = list(deltas)
+        for start in range(0, len(product_ids), APPLY_CHUNK_SIZE):
+            chunk = {product_id: deltas[product_id] for product_id in product_ids[start:start + APPLY_CHUNK_SIZE]}
+            Product.objects.filter(pk__in=chunk).update(
+                views_count=F('views_count') + _delta_case(chunk, 0),
+                likes_count=F('likes_count') + _delta_case(chunk, 1),
+            )
+
+        row_ids = [row[0] for row in rows]
+        for start in range(0, len(row_ids), APPLY_CHUNK_SIZE):
+            ProductCounterDelta.objects.filter(id__in=row_ids[start:start + APPLY_CHUNK_SIZE]).delete()
+
+        update_document_counters(product_ids)
+    return len(product_ids)
+
+
+def update_document_counters(product_ids):
+    """
+    Copy views_count / likes_count into the read documents without
+    re-rendering them: one SELECT and one bulk UPDATE per chunk. built_at
+    moves with them, so the ETag / Last-Modified of those documents change
+    and clients don't keep stale counts.
+    """
+    now = timezone.now()
+    for start in range(0, len(product_ids), APPLY_CHUNK_SIZE):
+        chunk = product_ids[start:start + APPLY_CHUNK_SIZE]
+        counts = {
+            pk: (views, likes)
+            for pk, views, likes in Product.objects.filter(pk__in=chunk).values_list('pk', 'views_count', 'likes_count')
+        }
+        documents = list(ProductDocument.objects.select_for_update().filter(product_id__in=counts).only('product_id', 'data', 'built_at'))
+        for document in documents:
+            document.data['views_count'], document.data['likes_count'] = counts[document.product_id]
+            document.built_at = now
+        ProductDocument.objects.bulk_update(documents, ['data', 'built_at'])
+
+
+counter_buffer = CounterBuffer()
+
+
+def record_view(product_id):
+    counter_buffer.add(product_id, views=1)
+
+
+def record_like(product_id):
+    counter_buffer.add(product_id, likes=1)
+
+
+def flush_counters():
+    """Drain this process's buffer and apply every pending delta."""
+    counter_buffer.drain()
+    return apply_counter_deltas()
+
+
+def _flush_at_exit():
+    """
+    A worker shutting down writes what is still in its buffer, the one
+    place a process's own hits can be drained from; processes that never
+    counted anything do not touch the database.
+    """
+    if not counter_buffer.has_pending():
+        return
+    try:
+        flush_counters()
+    except Exception:
+        logger.exception("Flushing product counters at exit failed")
+
+
+atexit.register(_flush_at_exit)
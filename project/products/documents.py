@@ -0,0 +1,123 @@
+from django.utils import timezone
+
+from .cache import bump_documents_version
+from .models import Offer, Product, ProductDocument
+from .offers import ActiveOfferResolver
+from .oncommit import OnCommitBatch
+from .serializers import PRODUCT_PREFETCH, ProductSerializer
+
+BUILD_CHUNK_SIZE = 500
+
+
+def _next_offer_boundaries(product_ids, now):
+    """Earliest future campaign start/end per product, i.e. when its display price can change."""
+    boundaries = {}
+    campaigns = Offer.objects.filter(
+        product_id__in=product_ids,
+        campaign__isnull=False
+    ).values_list('product_id', 'campaign__start_date', 'campaign__end_date')
+
+    for product_id, start, end in campaigns:
+        # an offer is live while start <= now <= end
+        upcoming = [moment for moment in (start,) if moment > now] + [moment for moment in (end,) if moment >= now]
+        for moment in upcoming:
+            if product_id not in boundaries or moment < boundaries[product_id]:
+                boundaries[product_id] = moment
+    return boundaries
+
+
+def build_product_documents(product_ids, now=None):
+    """
+    Re-render the given products into ProductDocument rows with a fixed
+    number of queries per chunk. Documents of deleted products are dropped.
+    The documents version only moves when a row was written or dropped.
+    """
+    now = now or timezone.now()
+    product_ids = list(set(product_ids))
+    documents = []
+    dropped = 0
+
+    for start in range(0, len(product_ids), BUILD_CHUNK_SIZE):
+        chunk = product_ids[start:start + BUILD_CHUNK_SIZE]
+        products = list(
+            Product.objects.filter(pk__in=chunk)
+            .select_related('subcategory')
+            .prefetch_related(*PRODUCT_PREFETCH)
+        )
+
+        gone = set(chunk) - {product.pk for product in products}
+        if gone:
+            dropped += ProductDocument.objects.filter(product_id__in=gone).delete()[0]
+        if not products:
+            continue
+
+        resolver = ActiveOfferResolver(now=now)
+        data = ProductSerializer(products, many=True, context={'offer_resolver': resolver}).data
+        boundaries = _next_offer_boundaries(chunk, now)
+
+        built = [
+            ProductDocument(
+                product=product,
+                category_id=product.subcategory.category_id if product.subcategory else None,
+                subcategory_id=product.subcategory_id,
+                available=product.available,
+                created_at=product.created_at,
+                data=rendered,
+                valid_until=boundaries.get(product.pk),
+            )
+            for product, rendered in zip(products, data)
+        ]
+        ProductDocument.objects.bulk_create(
+            built,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['category_id', 'subcategory_id', 'available', 'created_at', 'data', 'valid_until', 'built_at'],
+        )
+        documents.extend(built)
+
+    if documents or dropped:
+        bump_documents_version()
+    return documents
+
+
+# product ids waiting for the current transaction to commit
+_pending_rebuilds = OnCommitBatch(build_product_documents)
+
+
+def schedule_document_rebuild(product_ids):
+    """
+    Queue products for a rebuild once the current transaction commits, so a
+    product touched by many rows in one save is only rendered once.
+    """
+    _pending_rebuilds.add(product_ids)
+
+
+def catalog_documents(params):
+    """Available documents narrowed by the ?category= / ?subcategory= filters of product_list."""
+    documents = ProductDocument.objects.filter(available=True)
+    category_id = params.get('category')
+    subcategory_id = params.get('subcategory')
+    if category_id:
+        documents = documents.filter(category_id=category_id)
+    if subcategory_id:
+        documents = documents.filter(subcategory_id=subcategory_id)
+    return documents
+
+
+def refresh_stale_documents(documents, now=None):
+    """Rebuild every document in the queryset whose offer boundary has passed."""
+    now = now or timezone.now()
+    stale = list(documents.filter(valid_until__lte=now).values_list('product_id', flat=True))
+    if stale:
+        build_product_documents(stale, now=now)
+
+
+def document_data(documents, now=None):
+    """Return the payload of each document, rebuilding those an offer boundary has made stale."""
+    now = now or timezone.now()
+    documents = list(documents)
+    stale = [doc.product_id for doc in documents if doc.valid_until and doc.valid_until <= now]
+    rebuilt = {}
+    if stale:
+        rebuilt = {doc.product_id: doc for doc in build_product_documents(stale, now=now)}
+    return [rebuilt.get(doc.product_id, doc).data for doc in documents]
@@ -0,0 +1,215 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from .cache import documents_version
+from .documents import refresh_stale_documents
+from .models import ProductDocument
+
+FACETS = ('category', 'size', 'color', 'price', 'stock')
+
+# (label, lower bound inclusive, upper bound exclusive) on the display price
+PRICE_BANDS = (
+    ('0-1000', Decimal('0'), Decimal('1000')),
+    ('1000-2500', Decimal('1000'), Decimal('2500')),
+    ('2500-5000', Decimal('2500'), Decimal('5000')),
+    ('5000-10000', Decimal('5000'), Decimal('10000')),
+    ('10000+', Decimal('10000'), None),
+)
+
+# documents committed slightly out of built_at order are re-read on the next refresh
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+# how often a process re-checks the document table for writes made by other processes
+SIGNATURE_CHECK_INTERVAL = 5  # seconds
+
+
+def price_band(price):
+    try:
+        price = Decimal(str(price))
+    except (InvalidOperation, TypeError):
+        return None
+    for label, low, high in PRICE_BANDS:
+        if price >= low and (high is None or price < high):
+            return label
+    return None
+
+
+def document_facets(document):
+    """The (facet, value) pairs a product document belongs to."""
+    if not document.available:
+        return set()
+
+    data = document.data
+    pairs = {('stock', 'in' if data.get('stock', 0) > 0 else 'out')}
+    if document.category_id is not None:
+        pairs.add(('category', str(document.category_id)))
+    band = price_band(data.get('display_price'))
+    if band:
+        pairs.add(('price', band))
+    for size in data.get('sizes', []):
+        if size.get('waist_shoe_size'):
+            pairs.add(('size', size['waist_shoe_size'].strip()))
+        for color in size.get('colors', []):
+            if color.get('color_name'):
+                pairs.add(('color', color['color_name'].strip().lower()))
+    return pairs
+
+
+def _positions(mask):
+    """Positions of the set bits, highest first, scanning the binary string in C."""
+    bits = bin(mask)
+    top = len(bits) - 1
+    positions = []
+    index = bits.find('1', 2)
+    while index != -1:
+        positions.append(top - index)
+        index = bits.find('1', index + 1)
+    return positions
+
+
+#bit i of every mask stands for the product at position i, positions are dense and reused
+class FacetIndex:
+    """
+    Process-wide facet bitsets built from ProductDocument rows, so counts
+    are bit operations instead of GROUP BY queries. A request only reads
+    the documents version from the cache; the documents built since the
+    last sync are re-read when it moves, when the next offer boundary
+    passes, or when the table signature checked every
+    SIGNATURE_CHECK_INTERVAL seconds shows another process wrote them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.masks = defaultdict(lambda: defaultdict(int))  # facet -> value -> mask
+        self.memberships = {}  # product id -> set of (facet, value)
+        self.positions = {}  # product id -> bit position
+        self.product_ids = []  # bit position -> product id, None when free
+        self._free = []
+        self.available = 0
+        self.built_through = None
+        self.next_boundary = None
+        self._version = None
+        self._signature = None
+        self._checked_at = 0.0
+
+    def _bit(self, product_id):
+        position = self.positions.get(product_id)
+        if position is None:
+            position = self._free.pop() if self._free else len(self.product_ids)
+            if position == len(self.product_ids):
+                self.product_ids.append(product_id)
+            else:
+                self.product_ids[position] = product_id
+            self.positions[product_id] = position
+        return 1 << position
+
+    def _clear(self, product_id, bit):
+        for facet, value in self.memberships.pop(product_id, ()):
+            self.masks[facet][value] &= ~bit
+        self.available &= ~bit
+
+    def _set(self, document):
+        bit = self._bit(document.product_id)
+        self._clear(document.product_id, bit)
+
+        pairs = document_facets(document)
+        for facet, value in pairs:
+            self.masks[facet][value] |= bit
+        if document.available:
+            self.available |= bit
+        self.memberships[document.product_id] = pairs
+
+    def _drop(self, product_id):
+        position = self.positions.pop(product_id)
+        self._clear(product_id, 1 << position)
+        self.product_ids[position] = None
+        self._free.append(position)
+
+    def _table_signature(self):
+        state = ProductDocument.objects.aggregate(
+            built_at=Max('built_at'), count=Count('pk'), next_boundary=Min('valid_until'),
+        )
+        return state['built_at'], state['count'], state['next_boundary']
+
+    def _sync(self, version):
+        signature = self._table_signature()
+        documents = ProductDocument.objects.only('product_id', 'category_id', 'available', 'data', 'built_at')
+        if self.built_through is not None:
+            documents = documents.filter(built_at__gte=self.built_through - REFRESH_OVERLAP)
+        for document in documents.iterator():
+            self._set(document)
+
+        if len(self.positions) > signature[1]:
+            # every live document is indexed by now, so more positions than rows means some
+            # were deleted; only then are the ids compared to find which
+            existing = set(ProductDocument.objects.values_list('product_id', flat=True))
+            for product_id in [pk for pk in self.positions if pk not in existing]:
+                self._drop(product_id)
+
+        self.built_through = signature[0] or self.built_through
+        self.next_boundary = signature[2]
+        self._version = version
+        self._signature = signature
+        self._checked_at = time.monotonic()
+
+    def refresh(self, now=None):
+        now = now or timezone.now()
+        with self._lock:
+            if self.next_boundary is not None and now >= self.next_boundary:
+                # an offer started or ended, the prices (and price bands) of some documents moved
+                refresh_stale_documents(ProductDocument.objects.all(), now)
+                self._version = None
+
+            version = documents_version()
+            if version == self._version:
+                if time.monotonic() - self._checked_at < SIGNATURE_CHECK_INTERVAL:
+                    return
+                self._checked_at = time.monotonic()
+                if self._table_signature() == self._signature:
+                    return
+            self._sync(version)
+
+    def _selection(self, filters, skip=None):
+        mask = self.available
+        for facet, values in filters.items():
+            if facet == skip or not values:
+                continue
+            any_value = 0
+            for value in values:
+                any_value |= self.masks[facet].get(value, 0)
+            mask &= any_value
+        return mask
+
+    def query(self, filters):
+        """
+        Return (matching product ids, highest first, facet counts). Values
+        OR within a facet and AND across facets; each facet is counted
+        against the selection made by the other facets.
+        """
+        with self._lock:
+            selection = self._selection(filters)
+            product_ids = sorted((self.product_ids[position] for position in _positions(selection)), reverse=True)
+            counts = {}
+            for facet in FACETS:
+                base = self._selection(filters, skip=facet)
+                counts[facet] = sorted(
+                    (
+                        {"value": value, "count": (base & mask).bit_count()}
+                        for value, mask in self.masks[facet].items()
+                        if base & mask
+                    ),
+                    key=lambda entry: (-entry["count"], entry["value"]),
+                )
+            return product_ids, counts
+
+
+facet_index = FacetIndex()
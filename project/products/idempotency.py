@@ -0,0 +1,102 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+PURGE_BATCH_SIZE = 1000
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def _fingerprint(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _replay(record, endpoint, fingerprint):
+    if record.endpoint != endpoint or record.fingerprint != fingerprint:
+        return Response(
+            {"error": f"{HEADER} was already used for a different request"},
+            status=422
+        )
+    response = Response(record.response, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _stored(user, key, now):
+    return IdempotencyKey.objects.filter(user=user, key=key, expires_at__gt=now).first()
+
+
+#apply below @api_view/@permission_classes so request.user is the authenticated user
+def idempotent(view):
+    """
+    Run ``view`` at most once per (user, Idempotency-Key) and replay its
+    stored response to retries without touching orders or stock.
+
+    The key row is inserted in the same transaction as the view's writes, so
+    a concurrent duplicate blocks on the unique index until the first request
+    finishes and then replays what it committed. If the first request raises,
+    nothing is stored and the duplicate runs normally. Requests without the
+    header are not affected.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"error": f"{HEADER} is too long"}, status=400)
+
+        endpoint = view.__name__
+        fingerprint = _fingerprint(request.data)
+        now = timezone.now()
+
+        record = _stored(request.user, key, now)
+        if record is not None:
+            return _replay(record, endpoint, fingerprint)
+
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.filter(user=request.user, key=key, expires_at__lte=now).delete()
+                record = IdempotencyKey.objects.create(
+                    user=request.user,
+                    key=key,
+                    endpoint=endpoint,
+                    fingerprint=fingerprint,
+                    status_code=0,
+                    expires_at=now + key_ttl(),
+                )
+                response = view(request, *args, **kwargs)
+                record.status_code = response.status_code
+                record.response = response.data
+                record.save(update_fields=['status_code', 'response'])
+        except IntegrityError:
+            # a concurrent duplicate committed first, replay its response
+            record = _stored(request.user, key, timezone.now())
+            if record is None:
+                raise
+            return _replay(record, endpoint, fingerprint)
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys(now=None, batch_size=PURGE_BATCH_SIZE):
+    """Delete up to ``batch_size`` expired keys, returns how many went."""
+    now = now or timezone.now()
+    ids = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+    IdempotencyKey.objects.filter(id__in=ids).delete()
+    return len(ids)
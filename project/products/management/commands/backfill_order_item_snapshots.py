@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from products.models import OrderItem, snapshot_order_items
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "Fill the product snapshot of order items created before it existed, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        filled = 0
+        last_id = 0
+        while True:
+            ids = list(
+                OrderItem.objects.filter(pk__gt=last_id, product_name='')
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            filled += snapshot_order_items(OrderItem.objects.filter(pk__in=ids))
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Snapshotted {filled} order items"))
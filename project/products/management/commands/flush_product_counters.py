@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.counters import apply_counter_deltas
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply pending views/likes delta rows to Product.views_count and likes_count. "
+        "Worker buffers are written by their flusher threads and when the worker exits."
+    )
+
+    def handle(self, *args, **options):
+        touched = apply_counter_deltas()
+        self.stdout.write(self.style.SUCCESS(f"Updated counters of {touched} products"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.cart import CartStore, add_line
+from products.models import Order
+
+IMPORT_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Move carts stored as status='cart' orders into the cart cache and delete those orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        moved = 0
+        while True:
+            orders = list(
+                Order.objects.filter(status='cart').select_related('user')
+                .prefetch_related('items').order_by('pk')[:options['batch_size']]
+            )
+            if not orders:
+                break
+            for order in orders:
+                # added on top of whatever is already in the cached cart
+                with transaction.atomic(), CartStore(order.user).update() as lines:
+                    for item in order.items.all():
+                        add_line(lines, item.product_variant_id, item.quantity, item.price)
+                    order.delete()
+                moved += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} carts into the cart cache"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from products.idempotency import PURGE_BATCH_SIZE, purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Delete expired Idempotency-Key responses in batches (run from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        purged = 0
+        while True:
+            count = purge_expired_keys(batch_size=options['batch_size'])
+            purged += count
+            if count < options['batch_size']:
+                break
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} expired idempotency keys"))
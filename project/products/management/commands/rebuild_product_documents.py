@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from products.documents import BUILD_CHUNK_SIZE, build_product_documents
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Rebuild the precomputed ProductDocument rows used by product_list and product_detail."
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', nargs='*', type=int, help="Only rebuild these products")
+
+    def handle(self, *args, **options):
+        product_ids = options['product_ids'] or list(Product.objects.values_list('pk', flat=True))
+
+        for start in range(0, len(product_ids), BUILD_CHUNK_SIZE):
+            build_product_documents(product_ids[start:start + BUILD_CHUNK_SIZE])
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(product_ids)} product documents"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.search import INDEX_CHUNK_SIZE, index_products
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', nargs='*', type=int, help="Only reindex these products")
+
+    def handle(self, *args, **options):
+        product_ids = options['product_ids'] or list(Product.objects.values_list('pk', flat=True))
+
+        for start in range(0, len(product_ids), INDEX_CHUNK_SIZE):
+            index_products(product_ids[start:start + INDEX_CHUNK_SIZE])
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {len(product_ids)} products"))
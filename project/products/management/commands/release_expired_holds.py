@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from products.reservations import SWEEP_BATCH_SIZE, release_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Release expired checkout stock holds in batches (run from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        released = 0
+        while True:
+            count = release_expired_holds(batch_size=options['batch_size'])
+            released += count
+            if count < options['batch_size']:
+                break
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired holds"))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.buckets import campaign_variant_ids, shard_variant, unshard_variant
+from products.models import MainOffer
+
+
+class Command(BaseCommand):
+    help = "Switch variants in or out of flash-sale stock buckets, e.g. for every product of a MainOffer campaign."
+
+    def add_arguments(self, parser):
+        parser.add_argument('variant_ids', nargs='*', type=int, help="Variants to switch")
+        parser.add_argument('--campaign', type=int, help="Every variant on offer in this MainOffer")
+        parser.add_argument('--buckets', type=int, default=8, help="Bucket rows per variant")
+        parser.add_argument('--off', action='store_true', help="Fold the buckets back into the variant rows")
+
+    def handle(self, *args, **options):
+        variant_ids = list(options['variant_ids'])
+        if options['campaign']:
+            try:
+                variant_ids += campaign_variant_ids(options['campaign'])
+            except MainOffer.DoesNotExist:
+                raise CommandError(f"Campaign {options['campaign']} does not exist")
+        if not variant_ids:
+            raise CommandError("Give variant ids or --campaign")
+        if options['buckets'] < 1:
+            raise CommandError("--buckets must be at least 1")
+
+        for variant_id in sorted(set(variant_ids)):
+            if options['off']:
+                unshard_variant(variant_id)
+            else:
+                shard_variant(variant_id, options['buckets'])
+
+        mode = "out of" if options['off'] else f"into {options['buckets']}"
+        self.stdout.write(self.style.SUCCESS(f"Moved {len(set(variant_ids))} variants {mode} stock buckets"))
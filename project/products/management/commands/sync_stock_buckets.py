@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from products.buckets import rebalance_dry_buckets, sync_bucketed_stock
+
+
+class Command(BaseCommand):
+    help = "Rebalance dry flash-sale buckets and write their totals back to quantity and Product.stock (run from cron)."
+
+    def handle(self, *args, **options):
+        rebalanced = rebalance_dry_buckets()
+        synced = sync_bucketed_stock()
+        self.stdout.write(self.style.SUCCESS(f"Rebalanced {rebalanced} and synced {synced} bucketed variants"))
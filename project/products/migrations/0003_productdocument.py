@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:57
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDocument',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='products.product')),
+                ('category_id', models.BigIntegerField(blank=True, null=True)),
+                ('subcategory_id', models.BigIntegerField(blank=True, null=True)),
+                ('available', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField()),
+                ('data', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('valid_until', models.DateTimeField(blank=True, null=True)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['available', 'created_at'], name='productdoc_avail_created_idx'), models.Index(fields=['category_id', 'created_at'], name='productdoc_cat_created_idx'), models.Index(fields=['subcategory_id', 'created_at'], name='productdoc_sub_created_idx')],
+            },
+        ),
+    ]
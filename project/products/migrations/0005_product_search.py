@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:01
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_vector_index(apps, schema_editor):
+    # GIN only exists on postgres, other databases search through SearchTerm
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX productsearch_vector_gin ON products_productsearchindex USING GIN (vector)"
+        )
+
+
+def drop_vector_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS productsearch_vector_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_offer_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_index', serialize=False, to='products.product')),
+                ('name', models.CharField(max_length=200)),
+                ('taxonomy', models.CharField(blank=True, max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('vector', django.contrib.postgres.search.SearchVectorField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='products.product')),
+            ],
+        ),
+        migrations.RunPython(create_vector_index, drop_vector_index),
+    ]
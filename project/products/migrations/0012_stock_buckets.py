@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_order_item_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productsizecolor',
+            name='stock_buckets',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='0 = stock on this row; N = quantity/reserved are synced from N stock buckets'),
+        ),
+        migrations.CreateModel(
+            name='StockBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='products.productsizecolor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('variant', 'slot'), name='one_bucket_per_variant_slot')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def backfill_product_documents(apps, schema_editor):
+    """Build the read documents of products created before product_list was served from them."""
+    Product = apps.get_model('products', 'Product')
+    missing = list(Product.objects.filter(document__isnull=True).order_by('pk').values_list('pk', flat=True))
+    if not missing:
+        return
+
+    # documents are rendered by the live serializers, so this uses the current
+    # models; on a fresh database there is nothing to build and they are not touched
+    from products.documents import BUILD_CHUNK_SIZE, build_product_documents
+
+    for start in range(0, len(missing), BUILD_CHUNK_SIZE):
+        build_product_documents(missing[start:start + BUILD_CHUNK_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_drop_order_carts'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_product_documents, migrations.RunPython.noop, elidable=True),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def backfill_search_index(apps, schema_editor):
+    """Index products created before product search existed, so they can be found."""
+    Product = apps.get_model('products', 'Product')
+    missing = list(Product.objects.filter(search_index__isnull=True).order_by('pk').values_list('pk', flat=True))
+    if not missing:
+        return
+
+    # indexed through the live models like rebuild_search_index; a fresh database has nothing to index
+    from products.search import INDEX_CHUNK_SIZE, index_products
+
+    for start in range(0, len(missing), INDEX_CHUNK_SIZE):
+        index_products(missing[start:start + INDEX_CHUNK_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_backfill_product_documents'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop, elidable=True),
+    ]
@@ -1,7 +1,13 @@
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-from django.db.models import Sum
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
 from django.utils import timezone
 
+from .oncommit import OnCommitBatch
+
 # Create your models here.
 
 from django.conf import settings
@@ -53,22 +59,99 @@ class Product(models.Model):
     views_count = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination of product_list walks this index
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
    
-def update_product_stock(product):
+# sent with product_ids after their stock was rewritten by a queryset UPDATE (post_save does not fire)
+product_stock_changed = Signal()
+
+STOCK_CHUNK_SIZE = 500
+
+
+def recalculate_product_stock(product_ids):
     """
-    Recalculates and updates the total stock for a product
-    based on all ProductSizeColor quantities.
+    Set Product.stock to the sum of its variant quantities: one Sum aggregate
+    and one UPDATE per chunk of products, only writing the ones whose total
+    actually changed.
     """
-    total = ProductSizeColor.objects.filter(
-        product_size__product=product
-    ).aggregate(total=Sum('quantity'))['total'] or 0
-
-    # Only update if value changed (optional optimization)
-    if product.stock != total:
-        product.stock = total
-        product.save(update_fields=['stock'])
+    product_ids = list(set(product_ids))
+    changed = []
+
+    for start in range(0, len(product_ids), STOCK_CHUNK_SIZE):
+        chunk = product_ids[start:start + STOCK_CHUNK_SIZE]
+        totals = dict(
+            ProductSizeColor.objects.filter(product_size__product_id__in=chunk)
+            .values('product_size__product_id')
+            .annotate(total=Sum('quantity'))
+            .values_list('product_size__product_id', 'total')
+        )
+        stale = {
+            pk: totals.get(pk) or 0
+            for pk, stock in Product.objects.filter(pk__in=chunk).values_list('pk', 'stock')
+            if stock != (totals.get(pk) or 0)
+        }
+        if not stale:
+            continue
+
+        Product.objects.filter(pk__in=stale).update(
+            stock=Case(*[When(pk=pk, then=total) for pk, total in stale.items()], output_field=models.PositiveIntegerField())
+        )
+        changed.extend(stale)
+
+    if changed:
+        product_stock_changed.send(sender=Product, product_ids=changed)
+    return changed
+
+
+# products whose variants changed in the running transaction, recomputed once on commit
+_pending_stock = OnCommitBatch(recalculate_product_stock)
+
+
+def schedule_stock_refresh(product_ids):
+    _pending_stock.add(product_ids)
+
+
+# variant fields Product.stock depends on; reserved-only writes (stock holds) leave it alone
+STOCK_FIELDS = {'quantity', 'product_size', 'product_size_id'}
+
+
+#bulk paths skip post_save/post_delete, so they queue the stock refresh themselves
+class ProductSizeColorQuerySet(models.QuerySet):
+    def _product_ids(self):
+        return list(self.values_list('product_size__product_id', flat=True).distinct())
+
+    def _product_ids_of(self, objs):
+        size_ids = {obj.product_size_id for obj in objs}
+        return list(productsizes.objects.filter(pk__in=size_ids).values_list('product_id', flat=True))
+
+    def update(self, **kwargs):
+        if not STOCK_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+        product_ids = self._product_ids()
+        rows = super().update(**kwargs)
+        if 'product_size' in kwargs or 'product_size_id' in kwargs:
+            # rows moved to another size, refresh where they landed too
+            product_ids += self._product_ids()
+        schedule_stock_refresh(product_ids)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        schedule_stock_refresh(self._product_ids_of(objs))
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        if STOCK_FIELDS & set(fields):
+            schedule_stock_refresh(self._product_ids_of(objs))
+        return rows
 
 
 #the sizes are stored ,diff sizeor a product,it has its colors,the colors have quantity
@@ -92,6 +175,21 @@ class ProductSizeColor(models.Model):
     color_name = models.CharField(max_length=50)   
     hex_code = models.CharField(max_length=7 , blank=True, null=True)  
     quantity = models.PositiveIntegerField(default=0)  # Stock quantity for this size-color combination
+    reserved = models.PositiveIntegerField(default=0, editable=False)  # units held by pending orders (StockHold)
+    # flash-sale mode: >0 splits the unheld units over this many StockBucket rows (see products/buckets.py)
+    stock_buckets = models.PositiveSmallIntegerField(
+        default=0, editable=False,
+        help_text="0 = stock on this row; N = quantity/reserved are synced from N stock buckets"
+    )
+
+    objects = ProductSizeColorQuerySet.as_manager()
+
+    @property
+    def available_quantity(self):
+        # bucketed variants read their live bucket total when it was annotated (cart.load_variants)
+        if self.stock_buckets and getattr(self, 'bucket_stock', None) is not None:
+            return self.bucket_stock
+        return max(self.quantity - self.reserved, 0)
 
     def __str__(self):
         return f"{self.product_size.product.name} - {self.color_name} ({self.product_size.waist_shoe_size})"
@@ -120,6 +218,7 @@ class MainOffer(models.Model):
     description = models.TextField(blank=True)
     start_date = models.DateTimeField()
     end_date = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
     
 
     @property
@@ -140,6 +239,7 @@ class Offer(models.Model):
     new_price=models.DecimalField(max_digits=10, decimal_places=2)
     old_price = models.DecimalField(max_digits=10, decimal_places=2, editable=False, default=0)
     percentage_off = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def save(self, *args, **kwargs):
         # Store old_price and percentage_off in the DB
@@ -163,10 +263,90 @@ class Offer(models.Model):
             return f"{self.campaign.title} - {self.product.name}"
         return self.product.name
 
+
+#precomputed read document, one row per product, rebuilt by signals
+class ProductDocument(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="document")
+
+    # copied from the product so catalog filters never join
+    category_id = models.BigIntegerField(blank=True, null=True)
+    subcategory_id = models.BigIntegerField(blank=True, null=True)
+    available = models.BooleanField(default=True)
+    created_at = models.DateTimeField()
+
+    # ProductSerializer output: sizes, colors, images, stock, display price
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    # next campaign start/end that changes the display price, None if no offers
+    valid_until = models.DateTimeField(blank=True, null=True)
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available', 'created_at'], name='productdoc_avail_created_idx'),
+            models.Index(fields=['category_id', 'created_at'], name='productdoc_cat_created_idx'),
+            models.Index(fields=['subcategory_id', 'created_at'], name='productdoc_sub_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Document for product {self.product_id}"
+
+
+#full-text search index, one row per product
+class ProductSearchIndex(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="search_index")
+    name = models.CharField(max_length=200)
+    taxonomy = models.CharField(max_length=255, blank=True)  # subcategory + category names
+    description = models.TextField(blank=True)
+    # weighted tsvector, only filled on postgres (GIN indexed there)
+    vector = SearchVectorField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Search index for product {self.product_id}"
+
+
+#inverted index postings, used instead of the tsvector when the database is not postgres
+class SearchTerm(models.Model):
+    term = models.CharField(max_length=64, db_index=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="search_terms")
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
+
+
+#views/likes increments drained from the in-process buffers, applied to Product in batches
+class ProductCounterDelta(models.Model):
+    product_id = models.BigIntegerField(db_index=True)  # no FK, a hit never waits on the product row
+    views = models.PositiveIntegerField(default=0)
+    likes = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"+{self.views} views +{self.likes} likes for product {self.product_id}"
+
+
+#one like per user and product, product_like only counts the first
+class ProductLike(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='product_likes'
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="likes")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='one_like_per_user_product'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} likes product {self.product_id}"
+
     
 class Order(models.Model):
     STATUS_CHOICES = (
-        ('cart', 'Cart'),              # before checkout
+        ('cart', 'Cart'),              # legacy, carts live in the cache (products/cart.py) until checkout
         ('pending', 'Pending Payment'),
         ('processing', 'Processing'),
         ('completed', 'Completed'),
@@ -182,7 +362,7 @@ class Order(models.Model):
     status = models.CharField(
         max_length=20,
         choices=STATUS_CHOICES,
-        default='cart'
+        default='pending'
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -194,16 +374,46 @@ class Order(models.Model):
         default=0
     )
 
+    class Meta:
+        indexes = [
+            # order history pages by (created_at, id) within one user
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+        ]
+
     def update_total_price(self):
-        total = sum(item.total for item in self.items.all())
-        self.total_price = total
-        self.save(update_fields=['total_price'])
+        recalculate_order_totals([self.pk])
+        self.refresh_from_db(fields=['total_price'])
 
     def __str__(self):
         return f"Order {self.id} - {self.user.email} - {self.status}"
 
 
 
+#bulk item writes skip the signals, so they queue the order totals themselves
+class OrderItemQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        order_ids = list(self.values_list('order_id', flat=True).distinct())
+        if 'quantity' in kwargs or 'price' in kwargs:
+            kwargs.setdefault('total', kwargs.get('quantity', F('quantity')) * kwargs.get('price', F('price')))
+        rows = super().update(**kwargs)
+        if 'order' in kwargs or 'order_id' in kwargs:
+            order_ids += list(self.values_list('order_id', flat=True).distinct())
+        if kwargs.keys() & {'quantity', 'price', 'total', 'order', 'order_id'}:
+            schedule_order_total(order_ids)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        schedule_order_total({obj.order_id for obj in objs})
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        schedule_order_total({obj.order_id for obj in objs})
+        return rows
+
+
 #order item
 class OrderItem(models.Model):
     order = models.ForeignKey(
@@ -222,12 +432,24 @@ class OrderItem(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     total = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
 
+    # what the customer bought, frozen at add-to-cart/checkout so history survives catalog edits
+    product_name = models.CharField(max_length=200, blank=True, editable=False)
+    product_slug = models.SlugField(max_length=200, blank=True, editable=False)
+    size = models.CharField(max_length=50, blank=True, editable=False)
+    color = models.CharField(max_length=50, blank=True, editable=False)
+    hex_code = models.CharField(max_length=7, blank=True, editable=False)
+
+    objects = OrderItemQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
 
         # Set price from product
         if not self.price:
             self.price = self.product_variant.product_size.product.price
 
+        if not self.product_name:
+            self.take_snapshot()
+
         # Check stock availability
         if self.quantity > self.product_variant.quantity:
             raise ValueError("Not enough stock available")
@@ -235,12 +457,125 @@ class OrderItem(models.Model):
         self.total = self.quantity * self.price
 
         super().save(*args, **kwargs)
+        # the order total is refreshed on commit by the post_save signal
 
-        # Update order total
-        self.order.update_total_price()
+    def take_snapshot(self):
+        variant = self.product_variant
+        product = variant.product_size.product
+        self.product_name = product.name
+        self.product_slug = product.slug
+        self.size = variant.product_size.waist_shoe_size
+        self.color = variant.color_name
+        self.hex_code = variant.hex_code or ''
 
     def __str__(self):
-        return f"{self.quantity} x {self.product_variant}"
+        return f"{self.quantity} x {self.product_name} - {self.color} ({self.size})"
+
+
+# live catalog value -> OrderItem snapshot field
+SNAPSHOT_SOURCES = {
+    'product_name': 'product_size__product__name',
+    'product_slug': 'product_size__product__slug',
+    'size': 'product_size__waist_shoe_size',
+    'color': 'color_name',
+    'hex_code': 'hex_code',
+}
+
+
+def snapshot_order_items(items):
+    """
+    Copy the live product name, slug, size, colour and hex code onto
+    ``items`` (an OrderItem queryset) in one UPDATE. Returns the row count.
+    """
+    variant = ProductSizeColor.objects.filter(pk=OuterRef('product_variant_id'))
+    return items.update(**{
+        field: Coalesce(Subquery(variant.values(source)[:1]), Value(''))
+        for field, source in SNAPSHOT_SOURCES.items()
+    })
+
+
+def recalculate_order_totals(order_ids):
+    """
+    Rewrite total_price of the given orders in one UPDATE, summing their
+    items in the database. Only total_price is written.
+    """
+    order_ids = list(set(order_ids))
+    if not order_ids:
+        return
+    item_totals = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .values('order')
+        .annotate(sum=Sum('total'))
+        .values('sum')
+    )
+    Order.objects.filter(pk__in=order_ids).update(
+        total_price=Coalesce(Subquery(item_totals), Value(0), output_field=DecimalField(max_digits=10, decimal_places=2))
+    )
+
+
+# orders whose items changed in the running transaction, totalled once on commit
+_pending_totals = OnCommitBatch(recalculate_order_totals)
+
+
+def schedule_order_total(order_ids):
+    _pending_totals.add(order_ids)
+
+
+#one shard of a flash-sale variant's unheld stock, so buyers don't queue on one row lock
+class StockBucket(models.Model):
+    variant = models.ForeignKey(ProductSizeColor, on_delete=models.CASCADE, related_name="buckets")
+    slot = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['variant', 'slot'], name='one_bucket_per_variant_slot'),
+        ]
+
+    def __str__(self):
+        return f"{self.variant_id}[{self.slot}] = {self.quantity}"
+
+
+#time-limited stock reservation placed at checkout, consumed by payment_success
+class StockHold(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="holds")
+    variant = models.ForeignKey(ProductSizeColor, on_delete=models.CASCADE, related_name="holds")
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'variant'], name='one_hold_per_order_variant'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.variant_id} held for order {self.order_id}"
+
+
+#stored first response of a state-changing order request, replayed on retries
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=100)
+    fingerprint = models.CharField(max_length=64, help_text="sha256 of the request body")
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField(encoder=DjangoJSONEncoder, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='one_response_per_user_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.key} -> {self.status_code}"
+
 
 def complete_order(order):
     for item in order.items.all():
@@ -251,16 +586,14 @@ def complete_order(order):
     order.status = "completed"
     order.save()
 
-#to auto update stock of products
+#to auto update stock of products, once per product when the transaction commits
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 @receiver(post_save, sender=ProductSizeColor)
 def update_stock_on_color_save(sender, instance, **kwargs):
-    product = instance.product_size.product
-    update_product_stock(product)
+    schedule_stock_refresh([instance.product_size.product_id])
 
 @receiver(post_delete, sender=ProductSizeColor)
 def update_stock_on_color_delete(sender, instance, **kwargs):
-    product = instance.product_size.product
-    update_product_stock(product)
\ No newline at end of file
+    schedule_stock_refresh([instance.product_size.product_id])
\ No newline at end of file
@@ -0,0 +1,151 @@
+import copy
+import threading
+import time
+from datetime import timedelta
+
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from .models import MainOffer, Offer
+
+# how often a process re-checks the offer tables for writes made by other processes
+SIGNATURE_CHECK_INTERVAL = 5  # seconds
+
+
+def _better(offer, current):
+    """Deterministic pick among overlapping offers: lowest price, then lowest id."""
+    return current is None or (offer.new_price, offer.id) < (current.new_price, current.id)
+
+
+def _after_end(moment):
+    """An offer is still live at its campaign's end_date, gone right after."""
+    return moment + timedelta(microseconds=1) if moment else None
+
+
+#process-wide product id -> best active offer, valid until the next campaign boundary
+class OfferIndex:
+    """
+    Built from every live campaign in one query and valid until the next
+    campaign start/end. It is rebuilt when that boundary passes, when an
+    Offer/MainOffer changes in this process (signals), or when the offer
+    tables' signature changes in another process. A ``now`` slightly older
+    than the last build does not rebuild it while it is still inside the
+    same boundaries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._best = {}
+        self._built_for = None
+        self._valid_from = None
+        self._valid_until = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._dirty = True
+
+    def invalidate(self):
+        self._dirty = True
+
+    def _table_signature(self):
+        offers = Offer.objects.aggregate(count=Count('id'), updated_at=Max('updated_at'))
+        campaigns = MainOffer.objects.aggregate(count=Count('id'), updated_at=Max('updated_at'))
+        return (offers['count'], offers['updated_at'], campaigns['count'], campaigns['updated_at'])
+
+    def _boundaries(self, now):
+        """(last campaign start/end at or before ``now``, next one after it): the offer set is fixed in between."""
+        moments = MainOffer.objects.aggregate(
+            last_start=Max('start_date', filter=Q(start_date__lte=now)),
+            last_end=Max('end_date', filter=Q(end_date__lt=now)),
+            next_start=Min('start_date', filter=Q(start_date__gt=now)),
+            next_end=Min('end_date', filter=Q(end_date__gte=now)),
+        )
+        previous = [moment for moment in (moments['last_start'], _after_end(moments['last_end'])) if moment]
+        upcoming = [moment for moment in (moments['next_start'], _after_end(moments['next_end'])) if moment]
+        return (max(previous) if previous else None), (min(upcoming) if upcoming else None)
+
+    def _build(self, now):
+        offers = Offer.objects.filter(
+            campaign__start_date__lte=now,
+            campaign__end_date__gte=now
+        ).select_related('campaign')
+
+        best = {}
+        for offer in offers:
+            if _better(offer, best.get(offer.product_id)):
+                best[offer.product_id] = offer
+        return best
+
+    def _rebuild(self, now):
+        signature = self._table_signature()
+        self._best = self._build(now)
+        self._built_for = now
+        self._valid_from, self._valid_until = self._boundaries(now)
+        self._signature = signature
+        self._checked_at = time.monotonic()
+        self._dirty = False
+
+    def _is_current(self, now):
+        if self._dirty or self._built_for is None:
+            return False
+        if self._valid_until is not None and now >= self._valid_until:
+            return False
+        if time.monotonic() - self._checked_at >= SIGNATURE_CHECK_INTERVAL:
+            self._checked_at = time.monotonic()
+            if self._table_signature() != self._signature:
+                return False
+        return True
+
+    def snapshot(self, now=None):
+        """The product id -> offer map valid at ``now``; treat it as read-only."""
+        now = now or timezone.now()
+        with self._lock:
+            if not self._is_current(now):
+                self._rebuild(now)
+            elif self._valid_from is not None and now < self._valid_from:
+                # a request that started just before the last boundary: price it on its own, keep the index
+                return self._build(now)
+            return self._best
+
+    def get(self, product_id, now=None):
+        return self.snapshot(now).get(product_id)
+
+
+offer_index = OfferIndex()
+
+
+#per-render view of the offer index shared through serializer context
+class ActiveOfferResolver:
+    """
+    Takes one snapshot of the process-wide offer index, so every product
+    in a render is priced against the same set of offers with plain dict hits.
+    """
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+        self._offers = None
+
+    def load(self, product_ids):
+        if self._offers is None:
+            self._offers = offer_index.snapshot(self.now)
+
+    def get(self, product_id):
+        self.load([product_id])
+        return self._offers.get(product_id)
+
+    def get_for(self, product):
+        """The active offer with ``product`` attached, without touching the shared cached object."""
+        offer = self.get(product.id)
+        if offer is None:
+            return None
+        offer = copy.copy(offer)
+        offer.product = product
+        return offer
+
+
+def get_offer_resolver(context):
+    """Return the resolver shared through serializer context, creating it once."""
+    resolver = context.get('offer_resolver')
+    if resolver is None:
+        resolver = ActiveOfferResolver()
+        context['offer_resolver'] = resolver
+    return resolver
@@ -0,0 +1,33 @@
+import threading
+
+from django.db import transaction
+
+
+#collects keys for the running transaction and handles each key once on commit
+class OnCommitBatch:
+    """
+    ``add()`` keys from signals as rows change; ``handler`` gets the whole
+    set once the transaction commits (immediately in autocommit). Keys left
+    behind by a rolled back transaction are picked up by the next flush,
+    which is harmless because handlers recompute from the database.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self._local = threading.local()
+
+    def _pending(self):
+        if not hasattr(self._local, 'keys'):
+            self._local.keys = set()
+        return self._local.keys
+
+    def add(self, keys):
+        self._pending().update(key for key in keys if key is not None)
+        transaction.on_commit(self.flush, robust=True)
+
+    def flush(self):
+        keys = self._pending()
+        if not keys:
+            return
+        self._local.keys = set()
+        self.handler(keys)
@@ -0,0 +1,35 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+#keyset pagination for the product catalog
+class ProductCursorPagination(CursorPagination):
+    """
+    Pages products by (created_at, pk), newest first. The cursor is opaque
+    and every page is a range scan on the index, so page 500 costs the same as page 1.
+    """
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-pk')
+
+
+#ranked search results have no stable keyset, so they page by number
+class SearchPagination(PageNumberPagination):
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+#faceted browse results come out of a bitset, paged by number
+class FacetPagination(PageNumberPagination):
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+#order history, newest first, keyset paged like the catalog
+class OrderCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-pk')
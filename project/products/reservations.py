@@ -0,0 +1,202 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .buckets import bucketed_variants, return_to_buckets, take_from_buckets
+from .models import ProductSizeColor, StockHold
+
+SWEEP_BATCH_SIZE = 1000
+
+
+def hold_ttl():
+    return timedelta(seconds=getattr(settings, 'STOCK_HOLD_TTL', 15 * 60))
+
+
+def _by_variant(delta):
+    return Case(
+        *[When(pk=variant_id, then=Value(amount)) for variant_id, amount in delta.items()],
+        default=Value(0),
+        output_field=PositiveIntegerField(),
+    )
+
+
+def _order_lines(order):
+    """{variant_id: quantity} for every line of ``order``."""
+    lines = defaultdict(int)
+    for variant_id, quantity in order.items.values_list('product_variant_id', 'quantity'):
+        lines[variant_id] += quantity
+    return dict(lines)
+
+
+def _add_reserved(delta):
+    """Apply per-variant changes to ``reserved`` with one UPDATE, never going below zero."""
+    if delta:
+        ProductSizeColor.objects.filter(pk__in=delta).update(
+            reserved=Greatest(F('reserved') + _by_variant(delta), Value(0))
+        )
+
+
+class _ShortStock(Exception):
+    def __init__(self, variant_ids):
+        self.variant_ids = variant_ids
+
+
+def place_holds(order, lines, now=None):
+    """
+    Reserve ``lines`` ({variant_id: quantity}) for ``order`` until the TTL.
+    Variant rows are locked in id order so concurrent checkouts cannot
+    deadlock; flash-sale variants take their units from a stock bucket
+    instead and leave the variant row unlocked. All-or-nothing, returns the
+    variant ids that lacked stock. Must run inside a transaction.
+    """
+    now = now or timezone.now()
+    bucketed = bucketed_variants(lines)
+    variants = {
+        pk: (quantity, reserved)
+        for pk, quantity, reserved in ProductSizeColor.objects.select_for_update()
+        .filter(pk__in=[variant_id for variant_id in lines if variant_id not in bucketed])
+        .order_by('pk').values_list('pk', 'quantity', 'reserved')
+    }
+    existing = dict(StockHold.objects.filter(order=order).values_list('variant_id', 'quantity'))
+
+    short = []
+    for variant_id, wanted in sorted(lines.items()):
+        if variant_id in bucketed:
+            continue
+        if variant_id not in variants:
+            short.append(variant_id)
+            continue
+        quantity, reserved = variants[variant_id]
+        # a retried checkout already holds some of these units
+        if quantity - reserved + existing.get(variant_id, 0) < wanted:
+            short.append(variant_id)
+    if short:
+        return short
+
+    try:
+        with transaction.atomic():
+            for variant_id in sorted(bucketed):
+                change = lines[variant_id] - existing.get(variant_id, 0)
+                if change > 0 and not take_from_buckets(variant_id, change):
+                    raise _ShortStock([variant_id])
+                if change < 0:
+                    return_to_buckets(variant_id, bucketed[variant_id], -change)
+
+            _add_reserved({
+                variant_id: wanted - existing.get(variant_id, 0)
+                for variant_id, wanted in lines.items() if variant_id not in bucketed
+            })
+            StockHold.objects.filter(order=order).delete()
+            StockHold.objects.bulk_create([
+                StockHold(order=order, variant_id=variant_id, quantity=wanted, expires_at=now + hold_ttl())
+                for variant_id, wanted in lines.items()
+            ])
+    except _ShortStock as error:
+        return error.variant_ids
+    return []
+
+
+def release_holds(holds):
+    """Give the held units back and delete the holds (a StockHold queryset)."""
+    delta = defaultdict(int)
+    returned = defaultdict(int)
+    bucket_counts = {}
+    hold_ids = []
+    for hold_id, variant_id, quantity, buckets in holds.values_list(
+        'id', 'variant_id', 'quantity', 'variant__stock_buckets'
+    ):
+        if buckets:
+            returned[variant_id] += quantity
+            bucket_counts[variant_id] = buckets
+        else:
+            delta[variant_id] -= quantity
+        hold_ids.append(hold_id)
+    # one bucket per variant, in variant order, so a sweep never holds two buckets of one variant
+    for variant_id in sorted(returned):
+        return_to_buckets(variant_id, bucket_counts[variant_id], returned[variant_id])
+    _add_reserved(delta)
+    StockHold.objects.filter(id__in=hold_ids).delete()
+    return len(hold_ids)
+
+
+def release_expired_holds(now=None, variant_ids=None, batch_size=SWEEP_BATCH_SIZE):
+    """
+    Batched sweeper: release up to ``batch_size`` expired holds, optionally
+    only on some variants. Holds locked by another sweeper are skipped.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = StockHold.objects.filter(expires_at__lte=now)
+        if variant_ids is not None:
+            expired = expired.filter(variant_id__in=variant_ids)
+        ids = list(expired.select_for_update(skip_locked=True).order_by('id').values_list('id', flat=True)[:batch_size])
+        return release_holds(StockHold.objects.filter(id__in=ids))
+
+
+def reserve_order(order, now=None):
+    """
+    Hold every line of ``order``. Expired holds on short variants are swept
+    first and the reservation retried once. Returns the short variant ids.
+    """
+    lines = _order_lines(order)
+
+    with transaction.atomic():
+        short = place_holds(order, lines, now)
+    if short:
+        release_expired_holds(now, variant_ids=short)
+        with transaction.atomic():
+            short = place_holds(order, lines, now)
+    return short
+
+
+def consume_order_stock(order):
+    """
+    Decrement stock for every line of a paid ``order`` with one guarded
+    UPDATE, turning its holds into real decrements. Variant rows are locked
+    in id order first so concurrent payments cannot deadlock. A line without
+    a (live) hold must fit in the unreserved stock. Flash-sale variants
+    already gave their held units up to the hold, so only a shortfall is
+    taken from their buckets. Returns the variant ids that lacked stock, in
+    which case the caller must roll back. Must run inside a transaction.
+    """
+    lines = _order_lines(order)
+    held = dict(order.holds.values_list('variant_id', 'quantity'))
+    held = {variant_id: min(held.get(variant_id, 0), wanted) for variant_id, wanted in lines.items()}
+    bucketed = bucketed_variants(lines)
+    plain = {variant_id: wanted for variant_id, wanted in lines.items() if variant_id not in bucketed}
+
+    locked = {
+        pk: (quantity, reserved)
+        for pk, quantity, reserved in ProductSizeColor.objects.select_for_update()
+        .filter(pk__in=plain).order_by('pk').values_list('pk', 'quantity', 'reserved')
+    }
+    need, release = _by_variant(plain), _by_variant(held)
+    updated = 0
+    if plain:
+        updated = ProductSizeColor.objects.filter(
+            pk__in=plain,
+            quantity__gte=F('reserved') - release + need,
+        ).update(
+            quantity=F('quantity') - need,
+            reserved=Greatest(F('reserved') - release, Value(0)),
+        )
+
+    if updated != len(plain):
+        return [
+            variant_id for variant_id, wanted in sorted(plain.items())
+            if variant_id not in locked
+            or locked[variant_id][0] - locked[variant_id][1] + held[variant_id] < wanted
+        ]
+
+    for variant_id in sorted(bucketed):
+        missing = lines[variant_id] - held[variant_id]
+        if missing and not take_from_buckets(variant_id, missing):
+            return [variant_id]
+
+    StockHold.objects.filter(order=order).delete()
+    return []
@@ -0,0 +1,138 @@
+import re
+from collections import Counter, defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Q
+
+from .models import Product, ProductSearchIndex, SearchTerm
+from .oncommit import OnCommitBatch
+
+SEARCH_CONFIG = 'english'
+INDEX_CHUNK_SIZE = 500
+MAX_QUERY_TERMS = 8
+
+# fallback index weights, same order as the tsvector A/B/C weights
+NAME_WEIGHT = 4
+TAXONOMY_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return [token[:64] for token in TOKEN_RE.findall((text or "").lower())]
+
+
+def uses_postgres_search():
+    return connection.vendor == 'postgresql'
+
+
+def _taxonomy(product):
+    if not product.subcategory:
+        return ""
+    return f"{product.subcategory.name} {product.subcategory.category.name}"
+
+
+def _postings(product):
+    weights = Counter()
+    for field_text, weight in (
+        (product.name, NAME_WEIGHT),
+        (_taxonomy(product), TAXONOMY_WEIGHT),
+        (product.description, DESCRIPTION_WEIGHT),
+    ):
+        for token in tokenize(field_text):
+            weights[token] += weight
+    return [SearchTerm(term=term, product=product, weight=min(weight, 32767)) for term, weight in weights.items()]
+
+
+def index_products(product_ids):
+    """(Re)index the given products: tsvector on postgres, inverted index postings elsewhere."""
+    product_ids = list(set(product_ids))
+
+    for start in range(0, len(product_ids), INDEX_CHUNK_SIZE):
+        chunk = product_ids[start:start + INDEX_CHUNK_SIZE]
+        products = list(Product.objects.filter(pk__in=chunk).select_related('subcategory__category'))
+        if not products:
+            continue
+        found = [product.pk for product in products]
+
+        ProductSearchIndex.objects.bulk_create(
+            [
+                ProductSearchIndex(
+                    product=product,
+                    name=product.name,
+                    taxonomy=_taxonomy(product)[:255],
+                    description=product.description,
+                )
+                for product in products
+            ],
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['name', 'taxonomy', 'description'],
+        )
+
+        if uses_postgres_search():
+            ProductSearchIndex.objects.filter(pk__in=found).update(
+                vector=SearchVector('name', weight='A', config=SEARCH_CONFIG)
+                + SearchVector('taxonomy', weight='B', config=SEARCH_CONFIG)
+                + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+            )
+        else:
+            SearchTerm.objects.filter(product_id__in=found).delete()
+            SearchTerm.objects.bulk_create(
+                [posting for product in products for posting in _postings(product)],
+                batch_size=1000,
+            )
+
+
+_pending_index = OnCommitBatch(index_products)
+
+
+def schedule_search_index(product_ids):
+    """Reindex products once the current transaction commits."""
+    _pending_index.add(product_ids)
+
+
+def _postgres_search(tokens):
+    # every token is \w+, so it is safe to splice into a raw tsquery
+    query = SearchQuery(" & ".join(f"{token}:*" for token in tokens), search_type='raw', config=SEARCH_CONFIG)
+    return (
+        ProductSearchIndex.objects.filter(vector=query, product__document__available=True)
+        .annotate(rank=SearchRank(F('vector'), query))
+        .order_by('-rank', '-product_id')
+        .values_list('product_id', flat=True)
+    )
+
+
+def _fallback_search(tokens):
+    prefixes = Q()
+    for token in tokens:
+        prefixes |= Q(term__startswith=token)
+
+    postings = SearchTerm.objects.filter(
+        prefixes,
+        product__document__available=True
+    ).values_list('product_id', 'term', 'weight')
+
+    scores = defaultdict(int)
+    matched = defaultdict(set)
+    for product_id, term, weight in postings:
+        for position, token in enumerate(tokens):
+            if term.startswith(token):
+                matched[product_id].add(position)
+                scores[product_id] += weight
+
+    # every query token has to match (as a prefix) somewhere in the product
+    hits = [product_id for product_id, positions in matched.items() if len(positions) == len(tokens)]
+    return sorted(hits, key=lambda product_id: (-scores[product_id], -product_id))
+
+
+def search_product_ids(query):
+    """Ids of available products matching every word of ``query`` by prefix, best match first."""
+    tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not tokens:
+        return []
+    if uses_postgres_search():
+        return _postgres_search(tokens)
+    return _fallback_search(tokens)
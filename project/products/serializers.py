@@ -11,8 +11,11 @@ from .models import (
     Order,
     OrderItem,
 )
-from django.utils import timezone
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Prefetch
 from mainapp.models import User
+from .offers import get_offer_resolver
 
 
 # to reduce the nested depth we create a simplified product serializer for offers
@@ -75,6 +78,19 @@ class ProductSizeSerializer(serializers.ModelSerializer):
 
 
 
+# related rows ProductSerializer renders, prefetch these instead of querying per product
+PRODUCT_PREFETCH = ('images', 'sizes__colors', 'offers')
+
+
+#loads offers for the whole list before the children render
+class ProductListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        products = list(iterable)
+        get_offer_resolver(self.context).load([product.id for product in products])
+        return super().to_representation(products)
+
+
 class ProductSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
     sizes = ProductSizeSerializer(many=True, read_only=True)
@@ -89,15 +105,11 @@ class ProductSerializer(serializers.ModelSerializer):
             'price', 'stock', 'created_at', 'updated_at', 'image',
             'likes_count', 'views_count', 'sizes', 'images', 'offers', 'active_offer'
         ]
+        list_serializer_class = ProductListSerializer
 
     def _get_active_offer_obj(self, product):
-        """Return the Offer object if active, else None."""
-        now = timezone.now()
-        return Offer.objects.filter(
-            product=product,
-            campaign__start_date__lte=now,
-            campaign__end_date__gte=now
-        ).select_related('campaign').first()
+        """Return the best active Offer from the shared resolver, else None."""
+        return get_offer_resolver(self.context).get_for(product)
 
     def get_display_price(self, obj):
         offer = self._get_active_offer_obj(obj)
@@ -134,18 +146,7 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product_name = serializers.CharField(
-        source="product_variant.product_size.product.name",
-        read_only=True
-    )
-    size = serializers.CharField(
-        source="product_variant.product_size.waist_shoe_size",
-        read_only=True
-    )
-    color = serializers.CharField(
-        source="product_variant.color_name",
-        read_only=True
-    )
+    # product_name, size, color and hex_code are the line's snapshot, no catalog joins
 
     class Meta:
         model = OrderItem
@@ -153,8 +154,10 @@ class OrderItemSerializer(serializers.ModelSerializer):
             "id",
             "product_variant",
             "product_name",
+            "product_slug",
             "size",
             "color",
+            "hex_code",
             "quantity",
             "price",
             "total",
@@ -173,6 +176,8 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = [
             "id",
+            "user_id",
+            "user_email",
             "status",
             "total_price",
             "created_at",
@@ -182,6 +187,77 @@ class OrderSerializer(serializers.ModelSerializer):
 
 
 
+#order history rows: no items, just the aggregate
+class OrderSummarySerializer(serializers.ModelSerializer):
+    item_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ["id", "status", "total_price", "item_count"]
+
+
+def _relations(serializer, model):
+    """
+    (select_related paths, [(prefetch path, queryset)]) for every relation a
+    serializer's dotted sources and nested serializers walk from ``model``.
+    """
+    select, prefetch = set(), []
+    for field in serializer.fields.values():
+        if field.source == '*':
+            continue
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        nested = nested if isinstance(nested, serializers.BaseSerializer) else None
+        bits = field.source.split('.')
+        if nested is None:
+            bits = bits[:-1]  # the last bit is the attribute itself
+
+        current, path = model, []
+        for position, bit in enumerate(bits):
+            try:
+                relation = current._meta.get_field(bit)
+            except FieldDoesNotExist:
+                break
+            if not relation.is_relation:
+                break
+            if relation.one_to_many or relation.many_to_many:
+                # everything past a to-many hop is loaded with the prefetch's own queryset
+                queryset = relation.related_model._default_manager.all()
+                rest = bits[position + 1:]
+                if rest:
+                    prefetch.append(('__'.join(path + [bit] + rest), None))
+                else:
+                    queryset = eager_load(queryset, nested) if nested else queryset
+                    prefetch.append(('__'.join(path + [bit]), queryset))
+                break
+            path.append(bit)
+            current = relation.related_model
+        else:
+            if path:
+                select.add('__'.join(path))
+                if nested is not None:
+                    inner_select, inner_prefetch = _relations(nested, current)
+                    prefix = '__'.join(path) + '__'
+                    select |= {prefix + inner for inner in inner_select}
+                    prefetch += [(prefix + lookup, queryset) for lookup, queryset in inner_prefetch]
+    return select, prefetch
+
+
+def eager_load(queryset, serializer):
+    """Apply select_related/prefetch_related for everything ``serializer`` (class or instance) renders."""
+    if isinstance(serializer, type):
+        serializer = serializer()
+    select, prefetch = _relations(serializer, queryset.model)
+    if select:
+        queryset = queryset.select_related(*sorted(select))
+    if prefetch:
+        queryset = queryset.prefetch_related(*[
+            Prefetch(lookup, queryset=inner) if inner is not None else lookup
+            for lookup, inner in prefetch
+        ])
+    return queryset
+
+
+
 #ADMIN
 # For WRITING (CREATE/UPDATE) - accepts ID only
 class SubCategoryWriteSerializer(serializers.ModelSerializer):
@@ -1,10 +1,132 @@
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
-from .models import OrderItem, Order
+from .models import (
+    OrderItem,
+    Order,
+    schedule_order_total,
+    Category,
+    Product,
+    SubCategory,
+    productsizes,
+    ProductSizeColor,
+    ProductImage,
+    Offer,
+    MainOffer,
+    ProductDocument,
+    product_stock_changed,
+)
+from .buckets import apply_quantity_edit
+from .cache import bump_catalog_version_on_commit, bump_documents_version
+from .documents import schedule_document_rebuild
+from .offers import offer_index
+from .reservations import release_holds
+from .search import schedule_search_index
 
+#one SQL recompute per order when the transaction commits
 @receiver([post_save, post_delete], sender=OrderItem)
 def update_order_total(sender, instance, **kwargs):
-    order = instance.order
-    total = sum(item.price * item.quantity for item in order.items.all())
-    order.total_price = total
-    order.save()
+    schedule_order_total([instance.order_id])
+
+
+#keep the product read documents in step with the rows they are built from
+@receiver(post_save, sender=Product)
+def rebuild_document_on_product_save(sender, instance, **kwargs):
+    schedule_document_rebuild([instance.pk])
+
+@receiver([post_save, post_delete], sender=productsizes)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=Offer)
+def rebuild_document_on_child_change(sender, instance, **kwargs):
+    schedule_document_rebuild([instance.product_id])
+
+@receiver([post_save, post_delete], sender=ProductSizeColor)
+def rebuild_document_on_color_change(sender, instance, **kwargs):
+    product_id = productsizes.objects.filter(pk=instance.product_size_id).values_list('product_id', flat=True).first()
+    schedule_document_rebuild([product_id])
+
+@receiver(post_save, sender=MainOffer)
+def rebuild_documents_on_campaign_save(sender, instance, **kwargs):
+    schedule_document_rebuild(
+        Offer.objects.filter(campaign=instance).values_list('product_id', flat=True)
+    )
+
+@receiver(post_save, sender=SubCategory)
+def rebuild_documents_on_subcategory_save(sender, instance, **kwargs):
+    schedule_document_rebuild(
+        Product.objects.filter(subcategory=instance).values_list('pk', flat=True)
+    )
+
+
+#a new catalog version invalidates every cached catalog response
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=SubCategory)
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=productsizes)
+@receiver([post_save, post_delete], sender=ProductSizeColor)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=Offer)
+@receiver([post_save, post_delete], sender=MainOffer)
+def bump_catalog_version_on_change(sender, instance, **kwargs):
+    bump_catalog_version_on_commit()
+
+
+#readers of the documents (the facet index) notice deletions through this counter
+@receiver(post_delete, sender=ProductDocument)
+def bump_documents_version_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(bump_documents_version, robust=True)
+
+
+#keep the search index in step with product names, descriptions and taxonomy
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, update_fields=None, **kwargs):
+    # stock refreshes save with update_fields=['stock'], nothing searchable changed
+    if update_fields and not {'name', 'description', 'subcategory'} & set(update_fields):
+        return
+    schedule_search_index([instance.pk])
+
+@receiver(post_save, sender=SubCategory)
+def index_products_on_subcategory_save(sender, instance, **kwargs):
+    schedule_search_index(
+        Product.objects.filter(subcategory=instance).values_list('pk', flat=True)
+    )
+
+@receiver(post_save, sender=Category)
+def index_products_on_category_save(sender, instance, **kwargs):
+    schedule_search_index(
+        Product.objects.filter(subcategory__category=instance).values_list('pk', flat=True)
+    )
+
+
+#drop the in-process offer index as soon as an offer or campaign changes here
+@receiver([post_save, post_delete], sender=Offer)
+@receiver([post_save, post_delete], sender=MainOffer)
+def invalidate_offer_index(sender, instance, **kwargs):
+    offer_index.invalidate()
+    # again after commit, in case another request rebuilt it from the old rows meanwhile
+    transaction.on_commit(offer_index.invalidate)
+
+
+#stock rewritten by recalculate_product_stock skips post_save, refresh what depends on it
+@receiver(product_stock_changed)
+def refresh_after_stock_change(sender, product_ids, **kwargs):
+    schedule_document_rebuild(product_ids)
+    bump_catalog_version_on_commit()
+
+
+#deleting an order must give its held stock back
+@receiver(pre_delete, sender=Order)
+def release_holds_on_order_delete(sender, instance, **kwargs):
+    release_holds(instance.holds.all())
+
+
+#bucketed quantity is rewritten from the buckets, so an edit to it is routed into them
+@receiver(pre_save, sender=ProductSizeColor)
+def route_bucketed_quantity_edit(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None or not instance.stock_buckets:
+        return
+    if update_fields is not None and 'quantity' not in update_fields:
+        return
+    stored = ProductSizeColor.objects.filter(pk=instance.pk).values_list('quantity', flat=True).first()
+    if stored is not None:
+        apply_quantity_edit(instance, stored)
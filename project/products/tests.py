@@ -1,3 +1,609 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from .buckets import shard_variant, sync_bucketed_stock, take_from_buckets
+from .cart import CartStore, revalidate_cart
+from .counters import CounterBuffer, apply_counter_deltas
+from .documents import build_product_documents
+from .models import (
+    Category,
+    MainOffer,
+    Offer,
+    Order,
+    OrderItem,
+    Product,
+    ProductCounterDelta,
+    ProductDocument,
+    ProductSizeColor,
+    productsizes,
+    StockBucket,
+    StockHold,
+    SubCategory,
+)
+from .offers import OfferIndex, offer_index
+from .reservations import consume_order_stock, release_expired_holds, reserve_order
+
+
+def make_variant(product, quantity, color="red"):
+    size = productsizes.objects.create(product=product, waist_shoe_size="42")
+    return ProductSizeColor.objects.create(product_size=size, color_name=color, quantity=quantity)
+
+
+class CatalogTestCase(TestCase):
+    def setUp(self):
+        # the catalog cache and offer index outlive the test database, start every test from empty ones
+        caches['catalog'].clear()
+        offer_index.invalidate()
+        self.category = Category.objects.create(name="Shoes", slug="shoes")
+        self.subcategory = SubCategory.objects.create(name="Sneakers", category=self.category)
+        self.product = Product.objects.create(
+            name="Runner", slug="runner", description="light shoe", price=100, subcategory=self.subcategory
+        )
+        self.user = get_user_model().objects.create_user(email="buyer@example.com", password="x")
+
+    def order_for(self, lines, status="pending"):
+        order = Order.objects.create(user=self.user, status=status)
+        for variant, quantity in lines:
+            OrderItem.objects.create(order=order, product_variant=variant, quantity=quantity, price=100)
+        return order
+
+
+#ETag / Last-Modified answer 304 only while nothing changed
+class ConditionalCatalogTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        make_variant(self.product, 5)
+        self.other = Product.objects.create(
+            name="Walker", slug="walker", description="comfy shoe", price=80, subcategory=self.subcategory
+        )
+        make_variant(self.other, 3)
+        build_product_documents([self.product.pk, self.other.pk])
+
+    def test_matching_etag_gets_304(self):
+        url = reverse('product-detail', args=[self.product.pk])
+        etag = self.client.get(url)['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_unchanged_list_gets_304_for_last_modified(self):
+        url = reverse('product-list')
+        last_modified = self.client.get(url)['Last-Modified']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_product_change_breaks_etag(self):
+        url = reverse('product-detail', args=[self.product.pk])
+        etag = self.client.get(url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Runner 2"
+            self.product.save()
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_delete_moves_last_modified(self):
+        url = reverse('product-list')
+        last_modified = self.client.get(url)['Last-Modified']
+
+        # Last-Modified has one-second resolution, make the delete land later
+        later = timezone.now() + timedelta(seconds=5)
+        with mock.patch('products.cache.timezone.now', return_value=later):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.other.delete()
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([product["id"] for product in response.data["results"]], [self.product.pk])
+
+    def test_validators_do_not_write(self):
+        now = timezone.now()
+        campaign = MainOffer.objects.create(title="Sale", start_date=now - timedelta(days=1), end_date=now + timedelta(days=1))
+        Offer.objects.create(product=self.product, campaign=campaign, new_price=50)
+        build_product_documents([self.product.pk])
+        url = reverse('product-list')
+        last_modified = self.client.get(url)['Last-Modified']
+
+        with mock.patch('products.documents.build_product_documents') as build:
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        build.assert_not_called()
+
+
+#the offer index follows campaign starts and ends without being told
+class OfferIndexTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        self.index = OfferIndex()
+
+    def offer(self, start, end, price):
+        campaign = MainOffer.objects.create(title="Sale", start_date=start, end_date=end)
+        return Offer.objects.create(product=self.product, campaign=campaign, new_price=price)
+
+    def test_lowest_price_wins_among_overlapping_offers(self):
+        self.offer(self.now - timedelta(days=1), self.now + timedelta(days=1), 80)
+        best = self.offer(self.now - timedelta(hours=1), self.now + timedelta(hours=1), 60)
+
+        self.assertEqual(self.index.get(self.product.pk, self.now).pk, best.pk)
+
+    def test_offer_is_live_through_its_end_date(self):
+        end = self.now + timedelta(hours=1)
+        offer = self.offer(self.now - timedelta(hours=1), end, 60)
+
+        self.assertEqual(self.index.get(self.product.pk, self.now).pk, offer.pk)
+        self.assertEqual(self.index.get(self.product.pk, end).pk, offer.pk)
+        self.assertIsNone(self.index.get(self.product.pk, end + timedelta(microseconds=1)))
+
+    def test_campaign_start_is_picked_up_without_a_write(self):
+        start = self.now + timedelta(hours=1)
+        offer = self.offer(start, start + timedelta(days=1), 60)
+
+        self.assertIsNone(self.index.get(self.product.pk, self.now))
+        self.assertEqual(self.index.get(self.product.pk, start).pk, offer.pk)
+
+    def test_slightly_older_request_reuses_the_index(self):
+        self.offer(self.now - timedelta(days=1), self.now + timedelta(days=1), 60)
+        self.index.snapshot(self.now)
+
+        with self.assertNumQueries(0):
+            self.index.snapshot(self.now - timedelta(seconds=1))
+
+    def test_request_from_before_the_last_boundary_is_priced_on_its_own(self):
+        start = self.now - timedelta(seconds=1)
+        offer = self.offer(start, self.now + timedelta(days=1), 60)
+        self.index.snapshot(self.now)
+
+        self.assertNotIn(self.product.pk, self.index.snapshot(start - timedelta(seconds=1)))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.index.get(self.product.pk, self.now).pk, offer.pk)
+
+
+#views/likes are buffered in memory and written behind in batches
+@override_settings(PRODUCT_COUNTER_FLUSH_INTERVAL=3600)  # the tests flush, not the background thread
+class CounterTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        build_product_documents([self.product.pk])
+        self.buffer = CounterBuffer()
+
+    def test_flush_applies_buffered_hits(self):
+        for _ in range(3):
+            self.buffer.add(self.product.pk, views=1)
+        self.buffer.add(self.product.pk, likes=1)
+        built_at = ProductDocument.objects.get(pk=self.product.pk).built_at
+
+        self.buffer.drain()
+        self.assertEqual(ProductCounterDelta.objects.count(), 1)
+        self.assertEqual(apply_counter_deltas(), 1)
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.views_count, self.product.likes_count), (3, 1))
+        document = ProductDocument.objects.get(pk=self.product.pk)
+        self.assertEqual((document.data['views_count'], document.data['likes_count']), (3, 1))
+        self.assertGreater(document.built_at, built_at)
+        self.assertFalse(ProductCounterDelta.objects.exists())
+
+    def test_failed_write_keeps_the_hits(self):
+        self.buffer.add(self.product.pk, views=2)
+        with mock.patch.object(ProductCounterDelta.objects, 'bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.buffer.drain()
+        self.assertTrue(self.buffer.has_pending())
+
+        self.buffer.drain()
+        self.assertEqual(ProductCounterDelta.objects.get().views, 2)
+
+    def test_view_of_unknown_product_is_404(self):
+        response = self.client.post(reverse('product-view', args=[self.product.pk + 1000]))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_like_counts_once_per_user(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('product-like', args=[self.product.pk])
+
+        with mock.patch('products.views.record_like') as record_like:
+            statuses = [client.post(url).status_code for _ in range(2)]
+
+        self.assertEqual(statuses, [202, 200])
+        record_like.assert_called_once_with(self.product.pk)
+
+
+#Product.stock follows its variants once per transaction
+class StockRecomputeTests(CatalogTestCase):
+    def test_variant_changes_refresh_stock_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_variant(self.product, 3)
+            make_variant(self.product, 4, color="blue")
+            self.product.refresh_from_db()
+            self.assertEqual(self.product.stock, 0)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+
+    def test_queryset_update_of_quantity_refreshes_stock(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            variant = make_variant(self.product, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductSizeColor.objects.filter(pk=variant.pk).update(quantity=9)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 9)
+
+    def test_reserved_only_writes_queue_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            variant = make_variant(self.product, 3)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            ProductSizeColor.objects.filter(pk=variant.pk).update(reserved=2)
+            variant.reserved = 1
+            ProductSizeColor.objects.bulk_update([variant], ['reserved'])
+
+        self.assertEqual(callbacks, [])
+
+
+#concurrent adds to one cart all land and never go past the stock
+@override_settings(CACHES={
+    **settings.CACHES,
+    # locmem's add() is atomic within the process, which is all these threads need for the cart lock
+    'cart': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'cart-tests'},
+})
+class AddToCartTests(TransactionTestCase):
+    def setUp(self):
+        caches['cart'].clear()
+        subcategory = SubCategory.objects.create(
+            name="Sneakers", category=Category.objects.create(name="Shoes", slug="shoes")
+        )
+        product = Product.objects.create(
+            name="Runner", slug="runner", description="light shoe", price=100, subcategory=subcategory
+        )
+        self.variant = make_variant(product, 5)
+        self.user = get_user_model().objects.create_user(email="buyer@example.com", password="x")
+
+    def add(self, quantity=1):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.post(reverse('cart-add'), {"product_variant": self.variant.pk, "quantity": quantity}, format='json')
+
+    def in_cart(self):
+        return CartStore(self.user).load()[self.variant.pk]["quantity"]
+
+    def test_add_beyond_stock_is_rejected(self):
+        self.assertEqual(self.add(4).status_code, 200)
+
+        self.assertEqual(self.add(2).status_code, 400)
+        self.assertEqual(self.in_cart(), 4)
+
+    def test_concurrent_adds_stop_at_the_stock(self):
+        statuses = []
+
+        def add():
+            try:
+                statuses.append(self.add().status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuses), [200] * 5 + [400] * 3)
+        self.assertEqual(self.in_cart(), 5)
+
+
+#checkout holds stock, payment turns the hold into a decrement
+class StockHoldTests(CatalogTestCase):
+    def test_hold_reserves_stock_and_blocks_overselling(self):
+        variant = make_variant(self.product, 5)
+        first = self.order_for([(variant, 3)])
+        second = self.order_for([(variant, 3)])
+
+        self.assertEqual(reserve_order(first), [])
+        self.assertEqual(reserve_order(second), [variant.pk])
+
+        variant.refresh_from_db()
+        self.assertEqual((variant.quantity, variant.reserved), (5, 3))
+        self.assertFalse(StockHold.objects.filter(order=second).exists())
+
+    def test_retried_reservation_does_not_hold_twice(self):
+        variant = make_variant(self.product, 5)
+        order = self.order_for([(variant, 3)])
+
+        reserve_order(order)
+        self.assertEqual(reserve_order(order), [])
+
+        variant.refresh_from_db()
+        self.assertEqual(variant.reserved, 3)
+
+    def test_expired_holds_are_released_for_a_new_order(self):
+        variant = make_variant(self.product, 5)
+        stale = self.order_for([(variant, 4)])
+        reserve_order(stale, now=timezone.now() - timedelta(hours=1))
+
+        fresh = self.order_for([(variant, 4)])
+        self.assertEqual(reserve_order(fresh), [])
+        self.assertFalse(StockHold.objects.filter(order=stale).exists())
+        variant.refresh_from_db()
+        self.assertEqual(variant.reserved, 4)
+
+    def test_consume_turns_hold_into_decrement(self):
+        variant = make_variant(self.product, 5)
+        order = self.order_for([(variant, 2)])
+        reserve_order(order)
+
+        self.assertEqual(consume_order_stock(order), [])
+
+        variant.refresh_from_db()
+        self.assertEqual((variant.quantity, variant.reserved), (3, 0))
+        self.assertFalse(order.holds.exists())
+
+    def test_consume_without_hold_cannot_take_held_stock(self):
+        variant = make_variant(self.product, 5)
+        held = self.order_for([(variant, 4)])
+        reserve_order(held)
+        unheld = self.order_for([(variant, 2)])
+
+        self.assertEqual(consume_order_stock(unheld), [variant.pk])
+
+    def test_release_gives_units_back(self):
+        variant = make_variant(self.product, 5)
+        order = self.order_for([(variant, 2)])
+        reserve_order(order, now=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(release_expired_holds(), 1)
+        variant.refresh_from_db()
+        self.assertEqual(variant.reserved, 0)
+
+
+#Idempotency-Key replays the first response instead of running the view again
+class IdempotencyTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.variant = make_variant(self.product, 5)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, key=None):
+        CartStore(self.user).add(self.variant.pk, 2, self.product.price)
+        headers = {"HTTP_IDEMPOTENCY_KEY": key} if key else {}
+        return self.client.post(reverse('checkout'), {}, format='json', **headers)
+
+    def test_retry_replays_without_a_second_order(self):
+        first = self.checkout("key-1")
+        retry = self.checkout("key-1")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.reserved, 2)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        order_id = self.checkout("key-1").data["order_id"]
+
+        response = self.client.post(
+            reverse('payment-success'), {"order_id": order_id}, format='json', HTTP_IDEMPOTENCY_KEY="key-1"
+        )
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.get(pk=order_id).status, "pending")
+
+    def test_requests_without_key_are_not_replayed(self):
+        self.checkout()
+        self.checkout()
+
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 2)
+
+
+#order history pages stay stable while new orders come in
+class OrderPaginationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        start = timezone.now() - timedelta(days=1)
+        for minutes in range(5):
+            order = Order.objects.create(user=self.user, status="completed")
+            Order.objects.filter(pk=order.pk).update(created_at=start + timedelta(minutes=minutes))
+
+    def ids(self, response):
+        return [order["id"] for order in response.data["results"]]
+
+    def test_new_orders_do_not_shift_later_pages(self):
+        first = self.client.get(reverse('order-list'), {"page_size": 2})
+        Order.objects.create(user=self.user, status="completed")
+
+        seen = self.ids(first)
+        url = first.data["next"]
+        while url:
+            page = self.client.get(url)
+            seen += self.ids(page)
+            url = page.data["next"]
+
+        expected = list(Order.objects.filter(user=self.user).order_by('-created_at', '-pk').values_list('pk', flat=True))
+        self.assertEqual(seen, expected[1:])
+
+    def test_cart_orders_are_not_listed(self):
+        legacy = Order.objects.create(user=self.user, status="cart")
+
+        response = self.client.get(reverse('order-list'), {"page_size": 100, "summary": 1})
+
+        self.assertNotIn(legacy.pk, self.ids(response))
+        self.assertEqual(len(response.data["results"]), 5)
+
+
+#carts are repriced and restocked against the live catalog
+class CartRevalidationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.variant = make_variant(self.product, 3)
+        self.now = timezone.now()
+
+    def lines(self, quantity=1, price="100", offer=None):
+        return {self.variant.pk: {"quantity": quantity, "price": price, "offer": offer}}
+
+    def changes(self, check):
+        return {(diff["product_variant"], diff["change"]) for diff in check.diffs}
+
+    def test_unchanged_cart_is_valid(self):
+        check = revalidate_cart(self.lines(2))
+
+        self.assertTrue(check.valid)
+        self.assertEqual(check.total, Decimal("200"))
+
+    def test_price_change_is_flagged_and_applied(self):
+        Product.objects.filter(pk=self.product.pk).update(price=120)
+
+        check = revalidate_cart(self.lines(2))
+
+        self.assertEqual(self.changes(check), {(self.variant.pk, "price_changed")})
+        self.assertEqual(Decimal(check.lines[self.variant.pk]["price"]), Decimal("120"))
+        self.assertEqual(check.total, Decimal("240"))
+
+    def test_live_offer_price_is_used(self):
+        campaign = MainOffer.objects.create(
+            title="Sale", start_date=self.now - timedelta(days=1), end_date=self.now + timedelta(days=1)
+        )
+        offer = Offer.objects.create(product=self.product, campaign=campaign, new_price=60)
+
+        check = revalidate_cart(self.lines(1))
+
+        self.assertEqual(check.lines[self.variant.pk]["offer"], offer.pk)
+        self.assertEqual(check.total, Decimal("60"))
+
+    def test_expired_offer_goes_back_to_list_price(self):
+        campaign = MainOffer.objects.create(
+            title="Sale", start_date=self.now - timedelta(days=2), end_date=self.now - timedelta(days=1)
+        )
+        offer = Offer.objects.create(product=self.product, campaign=campaign, new_price=60)
+
+        check = revalidate_cart(self.lines(1, price="60", offer=offer.pk))
+
+        self.assertEqual(
+            self.changes(check), {(self.variant.pk, "offer_expired"), (self.variant.pk, "price_changed")}
+        )
+        self.assertIsNone(check.lines[self.variant.pk]["offer"])
+        self.assertEqual(check.total, Decimal("100"))
+
+    def test_quantity_is_clamped_to_unreserved_stock(self):
+        ProductSizeColor.objects.filter(pk=self.variant.pk).update(reserved=1)
+
+        check = revalidate_cart(self.lines(5))
+
+        self.assertEqual(check.diffs, [
+            {"product_variant": self.variant.pk, "change": "quantity_reduced", "old": 5, "new": 2},
+        ])
+        self.assertEqual(check.lines[self.variant.pk]["quantity"], 2)
+
+    def test_missing_and_sold_out_lines_are_dropped(self):
+        sold_out = make_variant(self.product, 0, color="blue")
+        lines = {
+            **self.lines(1),
+            sold_out.pk: {"quantity": 1, "price": "100", "offer": None},
+            sold_out.pk + 1000: {"quantity": 1, "price": "100", "offer": None},
+        }
+
+        check = revalidate_cart(lines)
+
+        self.assertEqual(list(check.lines), [self.variant.pk])
+        self.assertEqual(
+            self.changes(check), {(sold_out.pk, "out_of_stock"), (sold_out.pk + 1000, "unavailable")}
+        )
+
+    def test_checkout_orders_the_corrected_cart(self):
+        CartStore(self.user).add(self.variant.pk, 2, "90")
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.post(reverse('checkout'), {}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([change["change"] for change in response.data["changes"]], ["price_changed"])
+        self.assertEqual(Order.objects.get(pk=response.data["order_id"]).total_price, Decimal("200"))
+        self.assertEqual(CartStore(self.user).load(), {})
+
+
+#flash-sale variants spread their unheld stock over buckets
+class StockBucketTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.variant = make_variant(self.product, 10)
+
+    def buckets(self):
+        return list(StockBucket.objects.filter(variant=self.variant).order_by('slot').values_list('quantity', flat=True))
+
+    def synced(self):
+        sync_bucketed_stock([self.variant.pk])
+        self.variant.refresh_from_db()
+        return self.variant.quantity, self.variant.reserved
+
+    def test_shard_spreads_the_unheld_units(self):
+        ProductSizeColor.objects.filter(pk=self.variant.pk).update(reserved=2)
+
+        shard_variant(self.variant.pk, 3)
+
+        self.assertEqual(self.buckets(), [3, 3, 2])
+
+    def test_take_from_one_bucket(self):
+        shard_variant(self.variant.pk, 2)
+
+        self.assertTrue(take_from_buckets(self.variant.pk, 3))
+        self.assertEqual(sorted(self.buckets()), [2, 5])
+
+    def test_take_larger_than_any_bucket_draws_on_the_total(self):
+        shard_variant(self.variant.pk, 4)
+
+        self.assertTrue(take_from_buckets(self.variant.pk, 7))
+        self.assertEqual(self.buckets(), [1, 1, 1, 0])
+
+    def test_take_beyond_the_total_changes_nothing(self):
+        shard_variant(self.variant.pk, 4)
+
+        self.assertFalse(take_from_buckets(self.variant.pk, 11))
+        self.assertEqual(self.buckets(), [3, 3, 2, 2])
+
+    def test_hold_and_payment_go_through_the_buckets(self):
+        shard_variant(self.variant.pk, 2)
+        order = self.order_for([(self.variant, 4)])
+
+        self.assertEqual(reserve_order(order), [])
+        self.assertEqual(sum(self.buckets()), 6)
+        self.assertEqual(self.synced(), (10, 4))
+
+        self.assertEqual(consume_order_stock(order), [])
+        self.assertEqual(self.synced(), (6, 0))
+
+    def test_expired_hold_goes_back_into_the_buckets(self):
+        shard_variant(self.variant.pk, 2)
+        order = self.order_for([(self.variant, 4)])
+        reserve_order(order, now=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(release_expired_holds(), 1)
+        self.assertEqual(sum(self.buckets()), 10)
+
+    def test_quantity_edit_goes_into_the_buckets(self):
+        shard_variant(self.variant.pk, 2)
+        self.synced()
+
+        self.variant.quantity += 4
+        self.variant.save()
+
+        self.assertEqual(sum(self.buckets()), 14)
+        self.assertEqual(self.synced(), (14, 0))
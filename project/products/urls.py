@@ -14,15 +14,25 @@ urlpatterns = [
     # Products
     path('products/', views.product_list, name='product-list'),
     path('products/<int:pk>/', views.product_detail, name='product-detail'),
+    path('products/<int:pk>/view/', views.product_view_hit, name='product-view'),
+    path('products/<int:pk>/like/', views.product_like, name='product-like'),
+    path('search/', views.product_search, name='product-search'),
+    path('browse/', views.product_browse, name='product-browse'),
 
     # Orders
     path('orders/', views.order_list, name='order-list'),
-    path('orders/create/', views.order_create, name='order-create'),
+    path('cart/', views.cart_detail, name='cart-detail'),
+    path('cart/add/', views.add_to_cart, name='cart-add'),
+    path('checkout/', views.checkout, name='checkout'),
+    path('payment/success/', views.payment_success, name='payment-success'),
 
     #offers
     path('offers/', views.active_offers, name='active-offer-list'),
     path('offersby_campaign/', views.offers_by_campaign, name='offer-list'),
 
+    #catalog cache
+    path('cache-stats/', views.catalog_cache_stats, name='catalog-cache-stats'),
+
     #CATEGORY ADMIN
     path('categoryin/', views.category_insertion,name='categoryin'),
     path('categoryin/<int:pk>/', views.category_insertion,name='categoryin'),
@@ -1,13 +1,12 @@
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
 
-from .models import Category, SubCategory, Product, Order , Offer ,MainOffer,productsizes,ProductSizeColor,ProductImage ,OrderItem
+from .models import Category, SubCategory, Product, Order , Offer ,MainOffer,productsizes,ProductSizeColor,ProductImage ,OrderItem, ProductDocument, ProductLike
 from .serializers import (
     CategorySerializer,
     SubCategorySerializer,
-    ProductSerializer,
     OrderSerializer,
     OfferSerializer,
     MainOfferSerializer,
@@ -19,33 +18,77 @@ from .serializers import (
     ProductImageSerializerwrite,
     ProductSizeSerializerwrite,
     OrderItemSerializer,
+    OrderSummarySerializer,
+    PRODUCT_PREFETCH,
+    eager_load,
 )
+from .offers import ActiveOfferResolver
+from .pagination import ProductCursorPagination, SearchPagination, FacetPagination, OrderCursorPagination
+from .facets import FACETS, facet_index
+from .counters import record_view, record_like
+from .search import search_product_ids, tokenize
+from .documents import document_data, catalog_documents
+from .cache import catalog_cache, cache_stats
+from .conditional import (
+    conditional_catalog,
+    product_detail_validators,
+    product_list_validators,
+    category_detail_validators,
+    active_offer_validators,
+)
+from .cart import CartBusy, CartStore, add_line, current_price, load_variants, revalidate_cart
+from .reservations import reserve_order, consume_order_stock, hold_ttl
+from .idempotency import idempotent
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count
 from django.utils import timezone
 from rest_framework.decorators import parser_classes
 from rest_framework.parsers import MultiPartParser, FormParser
 
 
+def _nested_prefetch(prefix):
+    return [f"{prefix}__{path}" for path in PRODUCT_PREFETCH]
+
+
+def _offer_context(products):
+    """Serializer context with the active offers of every product already loaded."""
+    resolver = ActiveOfferResolver()
+    resolver.load([product.id for product in products])
+    return {'offer_resolver': resolver}
 
 
 # Categories
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_cache
 def category_list(request):
-    categories = Category.objects.filter(is_active=True)
-    serializer = CategorySerializer(categories, many=True)
+    categories = Category.objects.filter(is_active=True).prefetch_related(
+        'subcategories__category',
+        *_nested_prefetch('subcategories__products')
+    )
+    products = [p for c in categories for s in c.subcategories.all() for p in s.products.all()]
+    serializer = CategorySerializer(categories, many=True, context=_offer_context(products))
     return Response(serializer.data)
 
 
+@conditional_catalog(category_detail_validators)
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_cache
 def category_detail(request, slug):
     try:
-        category = Category.objects.get(slug=slug, is_active=True)
+        category = Category.objects.prefetch_related(
+            'subcategories__category',
+            *_nested_prefetch('subcategories__products')
+        ).get(slug=slug, is_active=True)
     except Category.DoesNotExist:
         return Response({"detail": "Category not found"}, status=status.HTTP_404_NOT_FOUND)
     
-    serializer = CategorySerializer(category)
+    products = [p for s in category.subcategories.all() for p in s.products.all()]
+    serializer = CategorySerializer(category, context=_offer_context(products))
     return Response(serializer.data)
 
 
@@ -53,9 +96,13 @@ def category_detail(request, slug):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_cache
 def subcategory_list(request):
-    subcategories = SubCategory.objects.all()
-    serializer = SubCategorySerializer(subcategories, many=True)
+    subcategories = SubCategory.objects.select_related('category').prefetch_related(
+        *_nested_prefetch('products')
+    )
+    products = [p for s in subcategories for p in s.products.all()]
+    serializer = SubCategorySerializer(subcategories, many=True, context=_offer_context(products))
     return Response(serializer.data)
 
 
@@ -63,47 +110,108 @@ def subcategory_list(request):
 @permission_classes([AllowAny])
 def subcategory_detail(request, pk):
     try:
-        subcategory = SubCategory.objects.get(pk=pk)
+        subcategory = SubCategory.objects.select_related('category').prefetch_related(
+            *_nested_prefetch('products')
+        ).get(pk=pk)
     except SubCategory.DoesNotExist:
         return Response({"detail": "Subcategory not found"}, status=status.HTTP_404_NOT_FOUND)
     
-    serializer = SubCategorySerializer(subcategory)
+    serializer = SubCategorySerializer(subcategory, context=_offer_context(subcategory.products.all()))
     return Response(serializer.data)
 
 
 # Products
 
+@conditional_catalog(product_list_validators)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def product_list(request):
-    products = Product.objects.filter(available=True)
+    # served from the precomputed read documents, one indexed scan per page
     # Optional filtering by category or subcategory via query params
-    category_id = request.GET.get('category')
-    subcategory_id = request.GET.get('subcategory')
-    if category_id:
-        products = products.filter(subcategory__category__id=category_id)
-    if subcategory_id:
-        products = products.filter(subcategory__id=subcategory_id)
-
-    serializer = ProductSerializer(products, many=True)
-    return Response(serializer.data)
+    documents = catalog_documents(request.GET)
 
+    paginator = ProductCursorPagination()
+    page = paginator.paginate_queryset(documents, request)
+    return paginator.get_paginated_response(document_data(page))
 
+
+@conditional_catalog(product_detail_validators)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def product_detail(request, pk):
-    try:
-        product = Product.objects.get(pk=pk, available=True)
-    except Product.DoesNotExist:
+    # every product has a document (built on save, backfilled by migration 0015)
+    document = ProductDocument.objects.filter(product_id=pk).first()
+    if document is None or not document.available:
         return Response({"detail": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
-    
-    serializer = ProductSerializer(product)
-    return Response(serializer.data)
+
+    return Response(document_data([document])[0])
+
+
+#popularity tracking, buffered and written behind in batches
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def product_view_hit(request, pk):
+    # unknown ids would only fill the buffer and the delta table
+    if not Product.objects.filter(pk=pk).exists():
+        return Response({"detail": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
+    record_view(pk)
+    return Response({"detail": "View recorded"}, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def product_like(request, pk):
+    if not Product.objects.filter(pk=pk).exists():
+        return Response({"detail": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    # only a user's first like counts
+    _, created = ProductLike.objects.get_or_create(user=request.user, product_id=pk)
+    if not created:
+        return Response({"detail": "Already liked"}, status=status.HTTP_200_OK)
+    record_like(pk)
+    return Response({"detail": "Like recorded"}, status=status.HTTP_202_ACCEPTED)
+
+
+#full-text search
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def product_search(request):
+    query = request.GET.get('q', '')
+    if not tokenize(query):
+        return Response({"detail": "Query parameter 'q' is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    paginator = SearchPagination()
+    page = paginator.paginate_queryset(search_product_ids(query), request)
+    documents = ProductDocument.objects.in_bulk(page)
+    ranked = [documents[product_id] for product_id in page if product_id in documents]
+    return paginator.get_paginated_response(document_data(ranked))
+
+
+#faceted browse: ?size=&color=&price=&stock=&category=, repeat a param to OR its values
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def product_browse(request):
+    filters = {facet: request.GET.getlist(facet) for facet in FACETS}
+    filters['color'] = [color.strip().lower() for color in filters['color']]
+
+    facet_index.refresh()
+    product_ids, counts = facet_index.query(filters)
+
+    paginator = FacetPagination()
+    page = paginator.paginate_queryset(product_ids, request)
+    documents = ProductDocument.objects.in_bulk(page)
+    response = paginator.get_paginated_response(
+        document_data([documents[product_id] for product_id in page if product_id in documents])
+    )
+    response.data['facets'] = counts
+    return response
 
 
 #active offers
+@conditional_catalog(active_offer_validators)
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_cache
 def active_offers(request):
     now = timezone.now()
 
@@ -119,8 +227,10 @@ def active_offers(request):
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 #active offers by campaign
+@conditional_catalog(active_offer_validators)
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_cache
 def offers_by_campaign(request):
     now = timezone.now()
 
@@ -145,7 +255,14 @@ def offers_by_campaign(request):
             OfferSerializer(offer).data
         )
 
-    return Response(grouped.values(), status=status.HTTP_200_OK)
+    return Response(list(grouped.values()), status=status.HTTP_200_OK)
+
+
+#hit/miss counters of the catalog response cache
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def catalog_cache_stats(request):
+    return Response(cache_stats())
 
 
 # --------------------
@@ -154,21 +271,20 @@ def offers_by_campaign(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def order_list(request):
-    orders = Order.objects.filter(user=request.user)
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data)
+    # carts live in the cache now; rows left from before are moved there by import_legacy_carts
+    orders = Order.objects.filter(user=request.user).exclude(status='cart')
 
+    # ?summary=1 skips the items, the count comes from the database
+    if request.GET.get('summary') in ('1', 'true'):
+        orders = orders.only('id', 'status', 'total_price', 'created_at').annotate(item_count=Count('items'))
+        serializer_class = OrderSummarySerializer
+    else:
+        orders = eager_load(orders, OrderSerializer)
+        serializer_class = OrderSerializer
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def order_create(request):
-    data = request.data.copy()
-    data['user'] = request.user.id  # attach logged-in user
-    serializer = OrderSerializer(data=data)
-    if serializer.is_valid():
-        serializer.save(user=request.user)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    paginator = OrderCursorPagination()
+    page = paginator.paginate_queryset(orders, request)
+    return paginator.get_paginated_response(serializer_class(page, many=True).data)
 
 
 #Now for the admin sector 
@@ -584,71 +700,109 @@ def offer_admin(request,pk=None):
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def add_to_cart(request):
-    variant_id = request.data.get("product_variant")
-    quantity = int(request.data.get("quantity", 1))
-
     try:
-        variant = ProductSizeColor.objects.get(id=variant_id)
-    except ProductSizeColor.DoesNotExist:
-        return Response({"error": "Variant not found"}, status=404)
-
-    if quantity > variant.quantity:
-        return Response({"error": "Not enough stock"}, status=400)
-
-    # 🔹 Create or get cart
-    order, created = Order.objects.get_or_create(
-        user=request.user,
-        status="cart"
-    )
+        variant_id = int(request.data.get("product_variant"))
+        quantity = int(request.data.get("quantity", 1))
+    except (TypeError, ValueError):
+        return Response({"error": "product_variant and quantity must be integers"}, status=400)
+    if quantity < 1:
+        return Response({"error": "Quantity must be a positive integer"}, status=400)
+
+    # 🔹 The cart lives in the cache, no Order rows until checkout; locked so concurrent adds both land
+    try:
+        with CartStore(request.user).update() as lines:
+            # 🔹 One query for the new variant and everything already in the cart
+            variants = load_variants(set(lines) | {variant_id})
+            variant = variants.get(variant_id)
+            if variant is None:
+                return Response({"error": "Variant not found"}, status=404)
 
-    item, created = OrderItem.objects.get_or_create(
-        order=order,
-        product_variant=variant,
-        defaults={
-            "quantity": quantity,
-            "price": variant.product_size.product.price
-        }
-    )
+            in_cart = lines.get(variant_id, {}).get("quantity", 0)
+            if in_cart + quantity > variant.available_quantity:
+                return Response({"error": "Not enough stock"}, status=400)
 
-    if not created:
-        item.quantity += quantity
-        item.save()
+            price, offer_id = current_price(variant.product_size.product, ActiveOfferResolver())
+            add_line(lines, variant_id, quantity, price, offer_id)
+    except CartBusy:
+        return Response({"error": "Cart is being updated, try again"}, status=409)
+    return Response(revalidate_cart(lines, variants).data())
 
-    order.update_total_price()
 
-    return Response(OrderSerializer(order).data)
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def cart_detail(request):
+    return Response(revalidate_cart(CartStore(request.user).load()).data())
 
 
-#now lock the cart and prepare it for payment
+#now turn the cached cart into an order, hold its stock and prepare it for payment
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@idempotent
 def checkout(request):
 
+    # 🔹 The cart stays locked from load to discard, so a concurrent checkout can't order the same lines twice
     try:
-        order = Order.objects.get(
-            user=request.user,
-            status="cart"
-        )
-    except Order.DoesNotExist:
-        return Response({"error": "No active cart"}, status=404)
+        with CartStore(request.user).update() as lines:
+            return _checkout_cart(request, lines)
+    except CartBusy:
+        return Response({"error": "Cart is being updated, try again"}, status=409)
 
-    if order.items.count() == 0:
+
+def _checkout_cart(request, lines):
+    """Turn the locked cart ``lines`` into a pending order; what was ordered is taken out of them."""
+    if not lines:
         return Response({"error": "Cart is empty"}, status=400)
 
-    order.status = "pending"
-    order.save()
+    # 🔹 Reprice and restock every line against the catalog in a fixed number of queries
+    variants = load_variants(list(lines))
+    check = revalidate_cart(lines, variants)
+    if not check.lines:
+        lines.clear()
+        return Response({"error": "None of the items are available anymore", "changes": check.diffs}, status=409)
+
+    with transaction.atomic():
+        order = Order.objects.create(user=request.user, status="pending", total_price=check.total)
+
+        # 🔹 The corrected lines go in with one bulk insert
+        order_items = []
+        for variant_id, line in check.lines.items():
+            item = OrderItem(
+                order=order,
+                product_variant=variants[variant_id],
+                quantity=line["quantity"],
+                price=Decimal(line["price"]),
+            )
+            item.total = item.price * item.quantity
+            item.take_snapshot()
+            order_items.append(item)
+        OrderItem.objects.bulk_create(order_items)
+
+        # 🔹 Reserve the stock for the payment window
+        short = reserve_order(order)
+        if short:
+            transaction.set_rollback(True)
+            return Response(
+                {"error": "Not enough stock", "product_variants": short},
+                status=409
+            )
+
+    # 🔹 The whole cart was ordered; nothing can have been added while it was locked
+    lines.clear()
 
     return Response({
         "message": "Order moved to pending. Proceed to payment.",
-        "order_id": order.id
+        "order_id": order.id,
+        "total_price": str(check.total),
+        "changes": check.diffs,
+        "hold_expires_in": int(hold_ttl().total_seconds()),
     })
 
 
 #payment 
-from django.db import transaction
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@idempotent
 @transaction.atomic
 def payment_success(request):
 
@@ -663,18 +817,14 @@ def payment_success(request):
     except Order.DoesNotExist:
         return Response({"error": "Order not found or not pending"}, status=404)
 
-    # 🔹 Reduce stock safely
-    for item in order.items.all():
-        variant = item.product_variant
-
-        if item.quantity > variant.quantity:
-            return Response(
-                {"error": f"Not enough stock for {variant}"},
-                status=400
-            )
-
-        variant.quantity -= item.quantity
-        variant.save()
+    # 🔹 Turn the checkout holds into real decrements, one guarded UPDATE
+    short = consume_order_stock(order)
+    if short:
+        transaction.set_rollback(True)
+        return Response(
+            {"error": "Not enough stock", "product_variants": short},
+            status=400
+        )
 
     order.status = "completed"
     order.save()
@@ -85,6 +85,12 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',  # checkout / payment retries, see products/idempotency.py
+]
+
+# let the frontend see that a retried checkout/payment was answered from the stored response
+CORS_EXPOSE_HEADERS = [
+    'Idempotent-Replayed',
 ]
 
 # CORS methods
@@ -127,6 +133,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'project.wsgi.application'
+# streaming chat needs an ASGI server, e.g. `uvicorn project.asgi:application`
+ASGI_APPLICATION = 'project.asgi.application'
 
 
 # Database
@@ -144,6 +152,87 @@ DATABASES = {
 }
 
 
+# Cache
+# The catalog response cache is a separate alias so it can point at a shared
+# backend (e.g. redis) while everything else stays on local memory.
+# Deploy step: aliases on the database cache need their tables, create them
+# with `python manage.py createcachetable` after `migrate` (it skips tables
+# that already exist and aliases that point elsewhere).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    },
+    'catalog': {
+        'BACKEND': os.getenv('CATALOG_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CATALOG_CACHE_LOCATION', 'catalog'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', 1000)),  # oldest entries culled past this
+        },
+    },
+    # catalog version counters and change marker (products/cache.py): ETags and Last-Modified are
+    # built from them, so every worker must see the same values
+    'catalog_state': {
+        'BACKEND': os.getenv('CATALOG_STATE_CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.getenv('CATALOG_STATE_CACHE_LOCATION', 'catalog_state_cache'),
+    },
+    # carts until checkout: shared by every worker, atomic add() for the cart lock, live carts never
+    # culled. Defaults to the database cache (see createcachetable above); for Redis set
+    # CART_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache and CART_CACHE_LOCATION=redis://...
+    'cart': {
+        'BACKEND': os.getenv('CART_CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.getenv('CART_CACHE_LOCATION', 'cart_cache'),
+        'OPTIONS': {
+            # only expired carts are culled below this
+            'MAX_ENTRIES': int(os.getenv('CART_CACHE_MAX_ENTRIES', 10_000_000)),
+        },
+    },
+}
+
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_STATE_CACHE_ALIAS = 'catalog_state'
+CATALOG_CACHE_TIMEOUT = 300  # seconds, shortened further to the next campaign start/end
+
+CART_CACHE_ALIAS = 'cart'
+CART_TTL = 30 * 24 * 60 * 60  # seconds an untouched cart is kept
+
+# views/likes are buffered per process and written behind; a crash loses at most this much
+PRODUCT_COUNTER_FLUSH_INTERVAL = 10  # seconds
+PRODUCT_COUNTER_MAX_PENDING = 1000  # hits
+
+# how long checkout holds stock for a pending order before the sweeper releases it
+STOCK_HOLD_TTL = 15 * 60  # seconds
+
+# how long a stored Idempotency-Key response is replayed to retries
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60  # seconds
+
+# chat tools query the ORM in-process; "http" makes them call CHAT_TOOLS_BASE_URL instead
+CHAT_TOOLS_MODE = os.getenv('CHAT_TOOLS_MODE', 'orm')
+CHAT_TOOLS_BASE_URL = os.getenv('CHAT_TOOLS_BASE_URL', 'http://127.0.0.1:8000/products')
+
+# seconds a chat tool result is reused; a catalog/offer change or campaign start/end drops it earlier
+CHAT_TOOL_CACHE_TTLS = {
+    'categories': 15 * 60,
+    'products': 5 * 60,
+    'product_detail': 2 * 60,  # carries live stock
+    'active_offers': 60,
+}
+
+# per-session chat memory: history beyond the budget slides out, idle sessions expire,
+# past CHAT_MAX_SESSIONS the least recently used go
+CHAT_MAX_SESSIONS = int(os.getenv('CHAT_MAX_SESSIONS', 5000))
+CHAT_HISTORY_TOKEN_BUDGET = 3000  # tokens of recent turns resent to the model
+CHAT_SUMMARY_TOKEN_BUDGET = 200  # tokens for the digest of turns that slid out
+CHAT_SESSION_IDLE_TIMEOUT = 30 * 60  # seconds
+
+# LLM gateway: chats talking to the model at once, how many may queue and for how long
+CHAT_LLM_HOST = os.getenv('OLLAMA_HOST')  # None = ollama's default
+CHAT_LLM_MAX_CONCURRENCY = int(os.getenv('CHAT_LLM_MAX_CONCURRENCY', 4))
+CHAT_LLM_MAX_QUEUE = int(os.getenv('CHAT_LLM_MAX_QUEUE', 32))  # beyond this -> 429
+CHAT_LLM_QUEUE_TIMEOUT = 10  # seconds queued before giving up -> 503
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 